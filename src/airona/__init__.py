@@ -1,27 +1,97 @@
+import argparse
 import logging
 
-from arc import GatewayClient
-from hikari import GatewayBot, Intents
-
-from airona.db.connection import db
-from airona.db.model import Base
-from airona.env import cfg, discord
-from airona.ext import raid, settings
+from airona.etc.startup import startup_profile
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(prog="airona")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="report import and initialization timings.",
+    )
+    args = parser.parse_args()
+
+    profile = startup_profile()
+    profile.enabled = args.profile_startup
+
+    with profile.measure("import hikari, arc"):
+        from arc import GatewayClient
+        from hikari import GatewayBot, Intents
+    with profile.measure("import airona.ext"):
+        from airona.ext import debug, raid, settings
+
+    from airona.env import cfg, discord
+    from airona.etc.memory import memory_tracker
+    from airona.etc.tracing import end_command_trace, start_command_trace
+
+    if cfg().memory.trace_on_start:
+        memory_tracker().start()
+
     logging.getLogger("apscheduler").setLevel(cfg().apscheduler.log_level)
     logging.getLogger("sqlalchemy.engine").setLevel(cfg().sqlalchemy.log_level)
 
-    bot = GatewayBot(discord().token, intents=Intents.NONE)
+    with profile.measure("init bot"):
+        bot = GatewayBot(discord().token, intents=Intents.NONE)
+
+        client = GatewayClient(bot)
+        client.add_hook(start_command_trace)
+        client.add_post_hook(end_command_trace)
+        client.add_plugin(settings.plugin)
+        client.add_plugin(raid.plugin)
+        client.add_plugin(debug.plugin)
 
-    client = GatewayClient(bot)
-    client.add_plugin(settings.plugin)
-    client.add_plugin(raid.plugin)
+    profile.report("main")
 
     bot.run()
 
 
 def init_db() -> None:
+    from airona.db.connection import db
+    from airona.db.model import Base
+
     db().engine.echo = True
     Base.metadata.create_all(db().engine)
+    # create_all skips existing tables, including indexes added to them later
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db().engine, checkfirst=True)
+
+
+def restore_db() -> None:
+    parser = argparse.ArgumentParser(
+        prog="airona-restore-db",
+        description="restore the databases from a backup. stop the bot first.",
+    )
+    parser.add_argument(
+        "backup", nargs="?", help="the backup to restore; defaults to the newest."
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="list the available backups."
+    )
+    args = parser.parse_args()
+
+    from pathlib import Path
+
+    from airona.db.backup import configured_databases, list_backups, restore_backup
+    from airona.env import cfg
+
+    backups = list_backups(Path(cfg().backup.path))
+    if args.list:
+        for backup in backups:
+            print(backup.name)
+        return
+    if args.backup is not None:
+        backup = next((b for b in backups if b.name == args.backup), None)
+        if backup is None:
+            parser.error(f"no backup named {args.backup}")
+    elif backups:
+        backup = backups[-1]
+    else:
+        parser.error("no backups found")
+
+    databases = configured_databases()
+    restore_backup(backup, databases)
+    for path in databases.values():
+        print(f"restored {path} from {backup.name}")
@@ -0,0 +1,178 @@
+import logging
+import shutil
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+
+from sqlalchemy import make_url
+
+from airona.env import cfg
+
+logger = logging.getLogger(__name__)
+
+
+class BackupContendedError(RuntimeError): ...
+
+
+@dataclass(slots=True)
+class BackupStats:
+    name: str
+    pages: int = 0
+    steps: int = 0
+    restarts: int = 0
+    lock_held: float = 0.0
+    max_lock_held: float = 0.0
+    duration: float = 0.0
+
+
+def sqlite_path(url: str) -> Path | None:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, ":memory:"):
+        return None
+    return Path(parsed.database)
+
+
+def configured_databases() -> dict[str, Path]:
+    databases = {}
+    for name, url in (
+        ("airona", cfg().db.url),
+        ("jobstore", cfg().apscheduler.jobstore),
+    ):
+        path = sqlite_path(url)
+        if path is None:
+            logger.warning("not backing up %s: not a sqlite file database", name)
+            continue
+        databases[name] = path
+    return databases
+
+
+def connect_read_only(path: Path, timeout: float = 5.0) -> sqlite3.Connection:
+    return sqlite3.connect(
+        f"{path.resolve().as_uri()}?mode=ro", timeout=timeout, uri=True
+    )
+
+
+def verify(path: Path) -> None:
+    with closing(connect_read_only(path)) as conn:
+        result = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    if result != ["ok"]:
+        raise ValueError(f"{path} failed the integrity check: {'; '.join(result)}")
+
+
+def copy_database(
+    name: str, source: Path, target: Path, pages: int, pause: float, max_restarts: int
+) -> BackupStats:
+    stats = BackupStats(name)
+    started = step_started = time.perf_counter()
+    last_remaining: int | None = None
+    restart_limit = max_restarts
+
+    # each step holds a read lock on the source, which keeps writers from
+    # committing; pausing between steps lets them through
+    def progress(status: int, remaining: int, total: int) -> None:
+        nonlocal step_started, last_remaining, restart_limit
+        held = time.perf_counter() - step_started
+        stats.steps += 1
+        stats.pages = total
+        stats.lock_held += held
+        stats.max_lock_held = max(stats.max_lock_held, held)
+        # a write from another connection restarts the copy from the first page
+        if last_remaining is not None and remaining > last_remaining:
+            stats.restarts += 1
+            if stats.restarts > restart_limit:
+                raise BackupContendedError(name)
+        last_remaining = remaining
+        if remaining:
+            time.sleep(pause)
+        step_started = time.perf_counter()
+
+    # a busy step returns at once instead of waiting in the busy handler, so
+    # the time between steps is the time the lock was actually held
+    with (
+        closing(connect_read_only(source, timeout=0)) as src,
+        closing(sqlite3.connect(target)) as dst,
+    ):
+        try:
+            # pauses happen in progress, including after a busy step
+            src.backup(dst, pages=pages, progress=progress, sleep=0)
+        except BackupContendedError:
+            # too busy to finish in steps; copy everything under one lock
+            logger.info("%s kept changing, copying it in one step", name)
+            last_remaining = None
+            restart_limit = stats.restarts + max_restarts
+            step_started = time.perf_counter()
+            src.backup(dst, pages=-1, progress=progress, sleep=0)
+
+    stats.duration = time.perf_counter() - started
+    return stats
+
+
+def list_backups(directory: Path) -> list[Path]:
+    if not directory.is_dir():
+        return []
+    # names are UTC timestamps, so they sort chronologically
+    return sorted(
+        path
+        for path in directory.iterdir()
+        if path.is_dir() and not path.name.endswith(".partial")
+    )
+
+
+def create_backup(
+    databases: dict[str, Path],
+    directory: Path,
+    keep: int,
+    pages: int,
+    pause: float,
+    max_restarts: int,
+) -> list[BackupStats]:
+    stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%SZ")
+    partial = directory / f"{stamp}.partial"
+    partial.mkdir(parents=True)
+    stats = []
+    try:
+        for name, source in databases.items():
+            target = partial / f"{name}.db"
+            stats.append(
+                copy_database(name, source, target, pages, pause, max_restarts)
+            )
+            verify(target)
+        partial.rename(directory / stamp)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+
+    for old in list_backups(directory)[:-keep]:
+        shutil.rmtree(old)
+    return stats
+
+
+def restore_backup(backup: Path, databases: dict[str, Path]) -> None:
+    # everything is verified and staged before the first database is replaced
+    for name, target in databases.items():
+        if any(
+            target.with_name(f"{target.name}{suffix}").exists()
+            for suffix in ("-journal", "-wal")
+        ):
+            raise FileExistsError(f"{target} is in use or was not closed cleanly")
+        verify(backup / f"{name}.db")
+
+    staged = {}
+    for name, target in databases.items():
+        staging = target.with_name(f"{target.name}.restore")
+        staging.unlink(missing_ok=True)
+        with (
+            closing(connect_read_only(backup / f"{name}.db")) as src,
+            closing(sqlite3.connect(staging)) as dst,
+        ):
+            src.backup(dst)
+        verify(staging)
+        staged[staging] = target
+
+    for staging, target in staged.items():
+        if target.exists():
+            target.replace(target.with_name(f"{target.name}.pre-restore"))
+        staging.replace(target)
@@ -4,17 +4,21 @@ from typing import Final
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
-from airona.db import sqlite
+from airona.db import profile, sqlite
 from airona.env import cfg
+from airona.etc.startup import startup_profile
 
 
 class DbConnection:
     def __init__(self) -> None:
         self.engine: Final = create_engine(cfg().db.url)
         sqlite.enable_foreign_keys(self.engine)
+        profile.instrument(self.engine, cfg().sqlalchemy.slow_query_ms)
         self.sm: Final = sessionmaker(self.engine)
+        profile.check_before_commit(self.sm)
 
 
 @functools.cache
 def db() -> DbConnection:
-    return DbConnection()
+    with startup_profile().measure("init db"):
+        return DbConnection()
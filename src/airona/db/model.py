@@ -1,6 +1,6 @@
 from typing import Final
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import JSON, ForeignKey, Index
 from sqlalchemy.ext.orderinglist import OrderingList, ordering_list
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -25,6 +25,7 @@ class Guild(Base):
 
 class Raid(Base):
     __tablename__: Final = "raid"
+    __table_args__ = (Index("ix_raid_guild_id_when", "guild_id", "when"),)
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     index: Mapped[int] = mapped_column()
@@ -53,8 +54,114 @@ class RaidUser(Base):
 
     raid_id: Mapped[int] = mapped_column(ForeignKey(Raid.id, ondelete="CASCADE"))
 
-    discord_id: Mapped[int] = mapped_column()
+    discord_id: Mapped[int] = mapped_column(index=True)
     role: Mapped[str] = mapped_column()
     has_cleared: Mapped[bool] = mapped_column()
 
     raid: Mapped[Raid] = relationship("Raid", back_populates="users")
+
+
+class RaidReminder(Base):
+    __tablename__: Final = "raid_reminder"
+
+    raid_id: Mapped[int] = mapped_column(
+        ForeignKey(Raid.id, ondelete="CASCADE"), primary_key=True
+    )
+
+    next_at: Mapped[int] = mapped_column(index=True)
+
+
+class RaidSeries(Base):
+    __tablename__: Final = "raid_series"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+
+    guild_id: Mapped[int] = mapped_column(ForeignKey(Guild.id, ondelete="CASCADE"))
+
+    channel_id: Mapped[int] = mapped_column()
+
+    host_discord_id: Mapped[int] = mapped_column()
+    host_username: Mapped[str] = mapped_column()
+    host_uid: Mapped[str] = mapped_column()
+    title: Mapped[str] = mapped_column()
+
+    next_when: Mapped[int] = mapped_column()
+    period: Mapped[int] = mapped_column()
+    carry_roster: Mapped[bool] = mapped_column()
+    last_raid_id: Mapped[int | None] = mapped_column(
+        ForeignKey(Raid.id, ondelete="SET NULL")
+    )
+
+
+class RaidEvent(Base):
+    __tablename__: Final = "raid_event"
+    __table_args__ = (Index("ix_raid_event_raid_id_id", "raid_id", "id"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+
+    raid_id: Mapped[int] = mapped_column(ForeignKey(Raid.id, ondelete="CASCADE"))
+
+    discord_id: Mapped[int] = mapped_column()
+    kind: Mapped[str] = mapped_column()
+    role: Mapped[str | None] = mapped_column()
+    has_cleared: Mapped[bool | None] = mapped_column()
+    at: Mapped[int] = mapped_column()
+
+
+class RaidRosterSnapshot(Base):
+    __tablename__: Final = "raid_roster_snapshot"
+
+    raid_id: Mapped[int] = mapped_column(
+        ForeignKey(Raid.id, ondelete="CASCADE"), primary_key=True
+    )
+
+    event_id: Mapped[int] = mapped_column()
+    users: Mapped[list[list]] = mapped_column(JSON)
+
+
+class UserAttendance(Base):
+    __tablename__: Final = "user_attendance"
+
+    guild_id: Mapped[int] = mapped_column(primary_key=True)
+    discord_id: Mapped[int] = mapped_column(primary_key=True)
+
+    signups: Mapped[int] = mapped_column(default=0)
+    clears: Mapped[int] = mapped_column(default=0)
+    no_shows: Mapped[int] = mapped_column(default=0)
+
+
+class RoleAttendance(Base):
+    __tablename__: Final = "role_attendance"
+
+    guild_id: Mapped[int] = mapped_column(primary_key=True)
+    role: Mapped[str] = mapped_column(primary_key=True)
+
+    signups: Mapped[int] = mapped_column(default=0)
+    clears: Mapped[int] = mapped_column(default=0)
+    no_shows: Mapped[int] = mapped_column(default=0)
+
+
+class Meta(Base):
+    __tablename__: Final = "meta"
+
+    key: Mapped[str] = mapped_column(primary_key=True)
+    value: Mapped[int] = mapped_column()
+
+
+class GuildTemplate(Base):
+    __tablename__: Final = "guild_template"
+
+    guild_id: Mapped[int] = mapped_column(
+        ForeignKey(Guild.id, ondelete="CASCADE"), primary_key=True
+    )
+
+    raid_message_template: Mapped[str | None] = mapped_column()
+    raid_ping_template: Mapped[str | None] = mapped_column()
+    raid_removal_dm_template: Mapped[str | None] = mapped_column()
+    raid_initial_thread_message_template: Mapped[str | None] = mapped_column()
+
+    dps_emoji: Mapped[str | None] = mapped_column()
+    tank_emoji: Mapped[str | None] = mapped_column()
+    support_emoji: Mapped[str | None] = mapped_column()
+    has_cleared_emoji: Mapped[str | None] = mapped_column()
+    sign_off_emoji: Mapped[str | None] = mapped_column()
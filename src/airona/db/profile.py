@@ -0,0 +1,145 @@
+import logging
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from sqlalchemy import Engine, event
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, sessionmaker
+
+from airona.env import cfg
+from airona.etc.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetError(RuntimeError): ...
+
+
+class QueryStats:
+    def __init__(self, name: str, budget: int | None = None) -> None:
+        self.name = name
+        self.budget = budget
+        self.statements = 0
+        self.duration = 0.0
+        self.checked = False
+
+
+class QueryTotals:
+    def __init__(self) -> None:
+        self.scopes = 0
+        self.statements = 0
+        self.duration = 0.0
+        self.over_budget = 0
+
+
+current_query_stats: ContextVar[QueryStats | None] = ContextVar(
+    "current_query_stats", default=None
+)
+query_totals: defaultdict[str, QueryTotals] = defaultdict(QueryTotals)
+
+
+@contextmanager
+def query_scope(name: str, budget: int | None = None) -> Iterator[QueryStats]:
+    stats = QueryStats(name, budget)
+    token = current_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
+        totals = query_totals[name]
+        totals.scopes += 1
+        totals.statements += stats.statements
+        totals.duration += stats.duration
+        logger.debug(
+            "%s: %d statements in %.2f ms",
+            name,
+            stats.statements,
+            stats.duration * 1000,
+        )
+    check_budget(stats)
+
+
+def check_budget(stats: QueryStats) -> None:
+    if stats.checked or stats.budget is None or stats.statements <= stats.budget:
+        return
+    stats.checked = True
+    query_totals[stats.name].over_budget += 1
+    message = (
+        f"{stats.name} issued {stats.statements} statements (budget {stats.budget})"
+    )
+    if cfg().sqlalchemy.enforce_query_budgets:
+        raise QueryBudgetError(message)
+    logger.warning(message)
+
+
+def check_before_commit(sm: sessionmaker) -> None:
+    # scopes wrap their transaction, so the budget is also checked before it
+    # commits; an overrun then rolls the transaction back
+    @event.listens_for(sm, "before_commit")
+    def _(session: Session) -> None:
+        stats = current_query_stats.get()
+        if stats is None or stats.budget is None:
+            return
+        session.flush()
+        check_budget(stats)
+
+
+def instrument(engine: Engine, slow_query_ms: int) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _(conn: Connection, cursor: Any, statement: str, *_) -> None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _(
+        conn: Connection,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        duration = time.perf_counter() - conn.info["query_start"].pop()
+        end = time.time_ns()
+        tracer().record(
+            f"db {statement.lstrip().split(maxsplit=1)[0].lower()}",
+            end - int(duration * 1e9),
+            end,
+            **{"db.system": conn.dialect.name, "db.statement": statement},
+        )
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.duration += duration
+        if duration * 1000 < slow_query_ms:
+            return
+        plan = "" if executemany else explain(conn, statement, parameters)
+        logger.warning(
+            "slow query in %s (%.2f ms): %s\n%s",
+            stats.name if stats is not None else "<untagged>",
+            duration * 1000,
+            statement,
+            plan,
+        )
+
+
+def explain(conn: Connection, statement: str, parameters: Any) -> str:
+    if conn.dialect.name != "sqlite" or not statement.lstrip().upper().startswith(
+        ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+    ):
+        return ""
+    # use the raw driver cursor so the plan query is not instrumented itself
+    driver_connection = conn.connection.driver_connection
+    if driver_connection is None:
+        return ""
+    cursor = driver_connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return "\n".join(f"  {row[-1]}" for row in cursor.fetchall())
+    except Exception as e:
+        return f"  (no plan: {e})"
+    finally:
+        cursor.close()
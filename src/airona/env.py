@@ -5,6 +5,8 @@ from pathlib import Path
 
 from pydantic import BaseModel
 
+from airona.etc.startup import startup_profile
+
 
 class Discord(BaseModel):
     token: str
@@ -12,8 +14,9 @@ class Discord(BaseModel):
 
 @functools.cache
 def discord() -> Discord:
-    with Path("./env/discord.toml").open("rb") as f:
-        return Discord(**tomllib.load(f))
+    with startup_profile().measure("load env/discord.toml"):
+        with Path("./env/discord.toml").open("rb") as f:
+            return Discord(**tomllib.load(f))
 
 
 class Config(BaseModel):
@@ -30,19 +33,88 @@ class Config(BaseModel):
 
     class Sqlalchemy(BaseModel):
         log_level: int = logging.WARNING
+        slow_query_ms: int = 100
+        enforce_query_budgets: bool = False
 
     sqlalchemy: Sqlalchemy
 
+    class Tracing(BaseModel):
+        sample_rate: float = 0.0
+        path: str = "./save/traces.jsonl"
+
+    tracing: Tracing = Tracing()
+
+    class Backup(BaseModel):
+        interval: int = 86400
+        path: str = "./save/backups"
+        keep: int = 7
+        pages: int = 64
+        pause: float = 0.005
+        max_restarts: int = 5
+
+    backup: Backup = Backup()
+
+    class Memory(BaseModel):
+        trace_on_start: bool = False
+        frames: int = 8
+        top: int = 10
+
+    memory: Memory = Memory()
+
 
 @functools.cache
 def cfg() -> Config:
-    with Path("./env/config.toml").open("rb") as f:
-        return Config(**tomllib.load(f))
+    with startup_profile().measure("load env/config.toml"):
+        with Path("./env/config.toml").open("rb") as f:
+            return Config(**tomllib.load(f))
 
 
 class RaidConfig(BaseModel):
     raid_cleanup_interval: int
     raid_misfire_grace_time: int
+    raid_reminder_offsets: list[int] = [0]
+    raid_reminder_interval: int = 10
+    raid_ping_max_length: int = 4000
+    raid_ping_max_mentions: int = 100
+    raid_ping_retries: int = 3
+    raid_ping_retry_delay: float = 2.0
+    raid_series_lead_time: int = 86400
+    raid_reconcile_interval: int = 3600
+    raid_purge_chunk_size: int = 200
+    raid_purge_pause: float = 0.1
+    raid_purge_progress_interval: float = 2.0
+    raid_list_page_size: int = 10
+    raid_list_cache_size: int = 256
+    raid_list_cache_ttl: int = 60
+    raid_snapshot_interval: int = 300
+    raid_snapshot_min_events: int = 20
+    raid_snapshot_batch_size: int = 100
+    raid_history_page_size: int = 20
+    raid_no_show_window: int = 3600
+    raid_stats_backfill_interval: int = 5
+    raid_stats_backfill_batch_size: int = 200
+    raid_cleanup_concurrency: int = 4
+    raid_config_reload_interval: int = 10
+    raid_interaction_ttl: int = 900
+    raid_interaction_cache_size: int = 16384
+    raid_drain_timeout: float = 10.0
+    raid_state_path: str = "./save/state.json"
+    raid_state_max_age: int = 600
+    raid_dm_concurrency: int = 2
+    raid_dm_queue_size: int = 1024
+    raid_dm_channel_cache_size: int = 1024
+    raid_dm_blocked_ttl: int = 600
+    raid_dm_blocked_size: int = 4096
+    raid_roster_cache_size: int = 4096
+    raid_template_cache_size: int = 1024
+    raid_template_max_length: int = 2000
+    raid_fingerprint_cache_size: int = 4096
+    raid_ping_queue_size: int = 256
+    raid_series_queue_size: int = 64
+    raid_rest_route_capacity: int = 5
+    raid_rest_route_period: float = 5.0
+    raid_rest_reserve: int = 1
+    raid_rest_max_routes: int = 4096
 
     raid_message_template: str
     raid_ping_template: str
@@ -59,7 +131,24 @@ class RaidConfig(BaseModel):
     emoji: Emoji
 
 
-@functools.cache
-def raid_cfg() -> RaidConfig:
-    with Path("./env/raid.toml").open("rb") as f:
+RAID_CFG_PATH = "./env/raid.toml"
+
+_raid_cfg: RaidConfig | None = None
+
+
+def load_raid_cfg() -> RaidConfig:
+    with Path(RAID_CFG_PATH).open("rb") as f:
         return RaidConfig(**tomllib.load(f))
+
+
+def set_raid_cfg(raid_config: RaidConfig) -> None:
+    global _raid_cfg
+    _raid_cfg = raid_config
+
+
+def raid_cfg() -> RaidConfig:
+    global _raid_cfg
+    if _raid_cfg is None:
+        with startup_profile().measure("load env/raid.toml"):
+            _raid_cfg = load_raid_cfg()
+    return _raid_cfg
@@ -1,4 +1,4 @@
-from arc import GatewayContext, GuildOnlyError
+from arc import GatewayContext, GuildOnlyError, NotOwnerError
 from hikari import MessageFlag
 
 
@@ -7,3 +7,10 @@ async def guild_only(ctx: GatewayContext, e: Exception) -> None:
         await ctx.respond("\N{CROSS MARK} guild_only", flags=MessageFlag.EPHEMERAL)
         return
     raise e
+
+
+async def owner_only(ctx: GatewayContext, e: Exception) -> None:
+    if isinstance(e, NotOwnerError):
+        await ctx.respond("\N{CROSS MARK} owner_only", flags=MessageFlag.EPHEMERAL)
+        return
+    raise e
@@ -0,0 +1,109 @@
+import functools
+import gc
+import os
+import resource
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+from airona.env import cfg
+
+PACKAGE_ROOT = Path(__file__).resolve().parents[1]
+
+
+@dataclass(slots=True)
+class SubsystemUsage:
+    name: str
+    size: int = 0
+    count: int = 0
+    size_diff: int = 0
+    count_diff: int = 0
+
+
+@functools.cache
+def airona_module(filename: str) -> str | None:
+    path = Path(filename)
+    if not path.is_relative_to(PACKAGE_ROOT):
+        return None
+    return ".".join(path.relative_to(PACKAGE_ROOT.parent).with_suffix("").parts)
+
+
+@functools.cache
+def package(filename: str) -> str:
+    _, found, inner = filename.partition(f"site-packages{os.sep}")
+    if found:
+        return inner.split(os.sep, 1)[0].removesuffix(".py")
+    return "<python>"
+
+
+def subsystem(traceback: tracemalloc.Traceback) -> str:
+    # an allocation belongs to the innermost airona module on its stack, or
+    # else to the package that made it
+    for frame in reversed(traceback):
+        module = airona_module(frame.filename)
+        if module is not None:
+            return module
+    return package(traceback[-1].filename)
+
+
+class MemoryTracker:
+    def __init__(self, frames: int) -> None:
+        self.frames = frames
+        self.baseline: tracemalloc.Snapshot | None = None
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def snapshot(self) -> tracemalloc.Snapshot:
+        self.start()
+        return tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),)
+        )
+
+    def diff(self) -> list[SubsystemUsage]:
+        # compares against the previous call; only allocations made since
+        # tracing started are seen
+        snapshot = self.snapshot()
+        grouped: dict[str, SubsystemUsage] = {}
+        if self.baseline is None:
+            for stat in snapshot.statistics("traceback"):
+                name = subsystem(stat.traceback)
+                usage = grouped.setdefault(name, SubsystemUsage(name))
+                usage.size += stat.size
+                usage.count += stat.count
+                usage.size_diff += stat.size
+                usage.count_diff += stat.count
+        else:
+            for diff in snapshot.compare_to(self.baseline, "traceback"):
+                name = subsystem(diff.traceback)
+                usage = grouped.setdefault(name, SubsystemUsage(name))
+                usage.size += diff.size
+                usage.count += diff.count
+                usage.size_diff += diff.size_diff
+                usage.count_diff += diff.count_diff
+        self.baseline = snapshot
+        return sorted(grouped.values(), key=lambda u: abs(u.size_diff), reverse=True)
+
+
+@functools.cache
+def memory_tracker() -> MemoryTracker:
+    return MemoryTracker(cfg().memory.frames)
+
+
+def object_counts(types: tuple[type, ...]) -> Counter[str]:
+    return Counter(type(o).__name__ for o in gc.get_objects() if isinstance(o, types))
+
+
+def rss() -> int | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+def peak_rss() -> int:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -0,0 +1,38 @@
+import functools
+import logging
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfile:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.origin = time.perf_counter()
+        self.timings: list[tuple[str, float]] = []
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((name, time.perf_counter() - start))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.origin
+
+    def report(self, stage: str) -> None:
+        if not self.enabled:
+            return
+        for name, seconds in self.timings:
+            logger.info("startup: %-28s %9.2f ms", name, seconds * 1000)
+        self.timings.clear()
+        logger.info("startup: %-28s %9.2f ms", stage, self.elapsed() * 1000)
+
+
+@functools.cache
+def startup_profile() -> StartupProfile:
+    return StartupProfile()
@@ -0,0 +1,241 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from pathlib import Path
+from typing import Any, TextIO, cast
+
+from arc import GatewayContext
+
+from airona.env import cfg
+
+logger = logging.getLogger(__name__)
+
+type Attribute = str | int | float | bool
+
+
+class Trace:
+    __slots__ = ("trace_id", "spans", "closed")
+
+    def __init__(self) -> None:
+        self.trace_id = os.urandom(16).hex()
+        self.spans: list[Span] = []
+        self.closed = False
+
+
+class Span:
+    __slots__ = (
+        "trace",
+        "span_id",
+        "parent_id",
+        "name",
+        "start",
+        "end",
+        "attributes",
+        "error",
+        "token",
+    )
+
+    def __init__(
+        self,
+        trace: Trace,
+        parent_id: str,
+        name: str,
+        attributes: dict[str, Attribute],
+        start: int | None = None,
+    ) -> None:
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time_ns() if start is None else start
+        self.end = 0
+        self.attributes = attributes
+        self.error: str | None = None
+        self.token: Token[Span | None] | None = None
+
+    def set(self, key: str, value: Attribute) -> None:
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict[str, Any]:
+        span: dict[str, Any] = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": [
+                {"key": key, "value": otlp_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": {"code": 1}
+            if self.error is None
+            else {"code": 2, "message": self.error},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def otlp_value(value: Attribute) -> dict[str, Any]:
+    match value:
+        case bool():
+            return {"boolValue": value}
+        case int():
+            return {"intValue": str(value)}
+        case float():
+            return {"doubleValue": value}
+        case _:
+            return {"stringValue": str(value)}
+
+
+current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    def __init__(self, sample_rate: float, path: str) -> None:
+        self.sample_rate = sample_rate
+        self.path = Path(path)
+        self.file: TextIO | None = None
+
+    def start(self, name: str, **attributes: Attribute) -> Span | None:
+        # opens a root span for a new trace, or a child span if one is active
+        parent = current_span.get()
+        if parent is None:
+            if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+                return None
+            span = Span(Trace(), "", name, attributes)
+        else:
+            span = Span(parent.trace, parent.span_id, name, attributes)
+        span.token = current_span.set(span)
+        return span
+
+    def finish(self, span: Span | None, error: BaseException | None = None) -> None:
+        if span is None:
+            return
+        span.end = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        if span.token is not None:
+            current_span.reset(span.token)
+        self.add(span)
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Attribute) -> Iterator[Span | None]:
+        span = self.start(name, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.finish(span, e)
+            raise
+        self.finish(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Attribute) -> Iterator[Span | None]:
+        # child spans are only recorded inside a sampled trace
+        if current_span.get() is None:
+            yield None
+            return
+        with self.trace(name, **attributes) as span:
+            yield span
+
+    def record(self, name: str, start: int, end: int, **attributes: Attribute) -> None:
+        parent = current_span.get()
+        if parent is None:
+            return
+        span = Span(parent.trace, parent.span_id, name, attributes, start)
+        span.end = end
+        self.add(span)
+
+    def add(self, span: Span) -> None:
+        # spans that end after their root (e.g. in a detached task) are dropped
+        if span.trace.closed:
+            return
+        span.trace.spans.append(span)
+        if not span.parent_id:
+            span.trace.closed = True
+            self.export(span.trace)
+
+    def export(self, trace: Trace) -> None:
+        line = json.dumps(
+            {
+                "resourceSpans": [
+                    {
+                        "resource": {
+                            "attributes": [
+                                {
+                                    "key": "service.name",
+                                    "value": {"stringValue": "airona"},
+                                }
+                            ]
+                        },
+                        "scopeSpans": [
+                            {
+                                "scope": {"name": "airona"},
+                                "spans": [span.to_otlp() for span in trace.spans],
+                            }
+                        ],
+                    }
+                ]
+            },
+            separators=(",", ":"),
+        )
+        try:
+            if self.file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.file = self.path.open("a", encoding="utf-8")
+            self.file.write(line + "\n")
+            self.file.flush()
+        except OSError as e:
+            logger.warning("Failed to export trace: %s", e)
+
+
+@functools.cache
+def tracer() -> Tracer:
+    config = cfg().tracing
+    return Tracer(config.sample_rate, config.path)
+
+
+def traced[**P, R](name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    # wraps a sync or async function in a span; entry points such as scheduler
+    # jobs start a new trace, everything else only nests inside one
+    def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args: P.args, **kwargs: P.kwargs) -> Any:
+                with tracer().trace(name):
+                    return await func(*args, **kwargs)
+
+            # the coroutine function check only narrows func to return a
+            # coroutine of Any, so the wrapper is typed back as func's type
+            return cast(Callable[P, R], async_wrapper)
+
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            with tracer().span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+async def start_command_trace(ctx: GatewayContext) -> None:
+    tracer().start(
+        f"command {' '.join(ctx.command.qualified_name)}",
+        **{"discord.guild_id": int(ctx.guild_id or 0)},
+    )
+
+
+async def end_command_trace(ctx: GatewayContext) -> None:
+    span = current_span.get()
+    if span is not None and not span.parent_id:
+        tracer().finish(span)
@@ -0,0 +1,125 @@
+import asyncio
+
+import arc
+from apscheduler.job import Job
+from arc import AutodeferMode, GatewayContext, GatewayPlugin
+from hikari import MessageFlag, Permissions
+
+from airona.db import model
+from airona.env import cfg, raid_cfg
+from airona.etc import error_handler
+from airona.etc.memory import memory_tracker, object_counts, peak_rss, rss
+from airona.ext.raid import (
+    dm_dispatcher,
+    interaction_cache,
+    ping_tasks,
+    rest_budget,
+)
+from airona.lib.fingerprint import fingerprints
+from airona.lib.listing import listing_cache
+from airona.lib.raid import raid_queue
+from airona.lib.roster import RaidSnapshot, roster_cache
+from airona.lib.series import series_queue
+from airona.lib.template import guild_templates
+
+plugin = GatewayPlugin(__name__)
+
+debug_group = plugin.include_slash_group(
+    "debug",
+    "Inspect the bot.",
+    autodefer=AutodeferMode.EPHEMERAL,
+    default_permissions=Permissions.ADMINISTRATOR,
+)
+debug_group.add_hook(arc.owner_only)
+debug_group.set_error_handler(error_handler.owner_only)
+
+
+def format_size(size: int | None) -> str:
+    if size is None:
+        return "n/a"
+    return f"{size / 2**20:,.1f} MiB"
+
+
+@debug_group.include
+@arc.slash_subcommand("memory", "Show memory usage and what grew since the last call.")
+async def _(ctx: GatewayContext) -> None:
+    raid_config = raid_cfg()
+    usage = await asyncio.to_thread(memory_tracker().diff)
+    # walking every object takes a while on a large heap
+    counts = await asyncio.to_thread(
+        object_counts, (model.Raid, model.RaidUser, RaidSnapshot, Job)
+    )
+    dispatcher = dm_dispatcher()
+    caches = [
+        ("roster cache", len(roster_cache), raid_config.raid_roster_cache_size),
+        ("listing cache", len(listing_cache), raid_config.raid_list_cache_size),
+        (
+            "fingerprints",
+            len(fingerprints),
+            raid_config.raid_fingerprint_cache_size,
+        ),
+        (
+            "template cache",
+            len(guild_templates),
+            raid_config.raid_template_cache_size,
+        ),
+        (
+            "interaction cache",
+            len(interaction_cache().seen),
+            raid_config.raid_interaction_cache_size,
+        ),
+        (
+            "ping queue",
+            raid_queue().qsize() + len(ping_tasks),
+            raid_config.raid_ping_queue_size,
+        ),
+        ("dm queue", dispatcher.queue.qsize(), raid_config.raid_dm_queue_size),
+        (
+            "dm channels",
+            len(dispatcher.channels),
+            raid_config.raid_dm_channel_cache_size,
+        ),
+        ("dm blocked", len(dispatcher.blocked), raid_config.raid_dm_blocked_size),
+        ("rest routes", len(rest_budget().routes), raid_config.raid_rest_max_routes),
+    ]
+
+    lines = [
+        f"rss {format_size(rss())}, peak {format_size(peak_rss())}",
+        f"series queue {series_queue().qsize()}",
+        *(f"{name} {size}/{cap}" for name, size, cap in caches),
+        "",
+        "objects",
+        *(f"  {name} {count}" for name, count in sorted(counts.items())),
+        "",
+        "allocations since the last call",
+        *(
+            f"  {u.name} {u.size_diff / 1024:+,.1f} KiB ({u.count_diff:+,} blocks), "
+            f"{u.size / 1024:,.1f} KiB total"
+            for u in usage[: cfg().memory.top]
+        ),
+    ]
+    await ctx.respond(
+        "```\n" + "\n".join(lines)[:1900] + "\n```", flags=MessageFlag.EPHEMERAL
+    )
+
+
+@debug_group.include
+@arc.slash_subcommand("rest", "Show REST calls, waits and rate limits per priority.")
+async def _(ctx: GatewayContext) -> None:
+    budget = rest_budget()
+    lines = [
+        f"routes {len(budget.routes)}/{budget.max_routes}",
+        *(
+            f"{name} {m['calls']:,.0f} calls, {m['waits']:,.0f} waited "
+            f"{m['wait_time']:,.1f} s, {m['rate_limited']:,.0f} rate limited"
+            for name, m in budget.metrics().items()
+        ),
+    ]
+    await ctx.respond("```\n" + "\n".join(lines) + "\n```", flags=MessageFlag.EPHEMERAL)
+
+
+@debug_group.include
+@arc.slash_subcommand("dms", "Show how many DMs were delivered, failed or dropped.")
+async def _(ctx: GatewayContext) -> None:
+    lines = [f"{name} {count:,}" for name, count in dm_dispatcher().metrics().items()]
+    await ctx.respond("```\n" + "\n".join(lines) + "\n```", flags=MessageFlag.EPHEMERAL)
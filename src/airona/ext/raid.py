@@ -1,4 +1,11 @@
+import asyncio
+import functools
+import logging
+import re
+import time
+from collections.abc import Callable, Coroutine, Sequence
 from datetime import UTC, datetime
+from pathlib import Path
 
 import arc
 import hikari
@@ -20,39 +27,119 @@ from arc import (
 from hikari import (
     ButtonStyle,
     ComponentInteractionCreateEvent,
-    Emoji,
     ForbiddenError,
-    InternalServerError,
+    HTTPError,
     MessageFlag,
     NotFoundError,
     Permissions,
     ResponseType,
     Snowflakeish,
     StartedEvent,
+    StoppingEvent,
 )
 from hikari.impl import (
+    AutocompleteChoiceBuilder,
     InteractiveButtonBuilder,
     MessageActionRowBuilder,
     TextDisplayComponentBuilder,
 )
 
 from airona.db import model
+from airona.db.backup import configured_databases, create_backup
 from airona.db.connection import db
+from airona.db.profile import query_scope
 from airona.env import cfg, raid_cfg
+from airona.etc.startup import startup_profile
+from airona.etc.tracing import traced, tracer
+from airona.lib.dm import DmDispatcher
+from airona.lib.events import (
+    EventKind,
+    compact_roster_snapshots,
+    raid_history,
+    rebuild_roster_cache,
+)
+from airona.lib.fingerprint import (
+    fingerprint,
+    fingerprints,
+    forget_fingerprint,
+    is_unchanged,
+    remember_fingerprint,
+)
+from airona.lib.handoff import (
+    Handoff,
+    save_handoff,
+    state_watermark,
+    take_handoff,
+)
+from airona.lib.listing import (
+    RaidPage,
+    list_guild_raids,
+    list_user_raids,
+    search_raids,
+)
 from airona.lib.raid import (
+    copy_raid_users,
     create_raid,
     create_raid_user,
     delete_raid_by_message_id,
     delete_raid_user_by_discord_id,
+    delete_raid_users_by_discord_ids,
     edit_raid_user,
     get_all_raids,
     get_raid_by_message_id,
-    get_raid_by_raid_id,
     get_raid_user_by_discord_id,
+    put_raid,
     raid_queue,
+    reminder_lead,
+    set_raid_users,
+    take_due_reminders,
+)
+from airona.lib.reconcile import reconcile_jobs, remove_stale_jobs
+from airona.lib.replay import ReplayCache
+from airona.lib.rest import INTERACTION_ROUTE, Priority, RestBudget, is_transient
+from airona.lib.roster import (
+    USER_ROLE_DPS,
+    USER_ROLE_SUPPORT,
+    USER_ROLE_TANK,
+    RaidUserSnapshot,
+    cache_roster,
+    get_raid_snapshot,
+    invalidate_roster,
+    load_raid_snapshot,
+    roster_cache,
+)
+from airona.lib.series import (
+    advance_series,
+    create_series,
+    delete_series,
+    get_guild_series,
+    get_series_by_id,
+    materialize_series,
+    next_occurrence,
+    put_series,
+    series_queue,
+)
+from airona.lib.stats import (
+    backfill_attendance,
+    get_role_attendance,
+    get_user_attendance,
+)
+from airona.lib.template import (
+    MENTION,
+    RaidTemplates,
+    build_template_values,
+    cached_guild_templates,
+    format_lead,
+    load_guild_templates,
+    raid_message_link,
+    raid_templates,
+    reload_raid_templates_if_changed,
+    split_mentions,
 )
 from airona.typing import Components
 
+logger = logging.getLogger(__name__)
+
 plugin = GatewayPlugin(__name__)
 
 raid_group = plugin.include_slash_group(
@@ -62,9 +149,12 @@ raid_group = plugin.include_slash_group(
     default_permissions=Permissions.CREATE_EVENTS | Permissions.MANAGE_EVENTS,
 )
 
-USER_ROLE_DPS = "dps"
-USER_ROLE_TANK = "tank"
-USER_ROLE_SUPPORT = "support"
+# browsing raids is open to every member, managing them is not
+raids_group = plugin.include_slash_group(
+    "raids",
+    "Browse raids.",
+    autodefer=AutodeferMode.EPHEMERAL,
+)
 
 RAID_PREFIX = "raid"
 RAID_ROLE_PREFIX = f"{RAID_PREFIX}:role"
@@ -73,15 +163,193 @@ RAID_ROLE_TANK = f"{RAID_ROLE_PREFIX}:{USER_ROLE_TANK}"
 RAID_ROLE_SUPPORT = f"{RAID_ROLE_PREFIX}:{USER_ROLE_SUPPORT}"
 RAID_CLEARED = f"{RAID_PREFIX}:cleared"
 RAID_SIGNOFF = f"{RAID_PREFIX}:signoff"
+RAID_PAGE_PREFIX = f"{RAID_PREFIX}:page"
+RAID_PAGE_GUILD = f"{RAID_PAGE_PREFIX}:guild"
+RAID_PAGE_USER = f"{RAID_PAGE_PREFIX}:user"
 
+ATTENDANCE_BACKFILL_JOB = "attendance_backfill"
+
+# work handed out by the queue loops, so that shutdown can drain it and hand
+# whatever is left over to the next process
+ping_tasks: dict[asyncio.Task[None], int] = {}
+series_tasks: dict[asyncio.Task[None], int] = {}
+intake_tasks: list[asyncio.Task[None]] = []
+worker_tasks: list[asyncio.Task[None]] = []
+liveness_swept_at: float | None = None
+# indexes of the ping chunks already sent, kept for pings cancelled by shutdown
+ping_progress: dict[int, set[int]] = {}
+
+
+def spawn(
+    tasks: dict[asyncio.Task[None], int], coro: Coroutine[None, None, None], id: int
+) -> None:
+    task = plugin.client.create_task(coro)
+    tasks[task] = id
+    task.add_done_callback(tasks.pop)
+
+
+@functools.cache
+def raid_jobstore() -> SQLAlchemyJobStore:
+    return SQLAlchemyJobStore(cfg().apscheduler.jobstore)
+
+
+@functools.cache
+def raid_scheduler() -> AsyncIOScheduler:
+    with startup_profile().measure("init raid_scheduler"):
+        return AsyncIOScheduler(
+            jobstores={
+                "default": raid_jobstore(),
+                "memory": MemoryJobStore(),
+            },
+            timezone=UTC,
+        )
+
+
+@functools.cache
+def rest_budget() -> RestBudget:
+    raid_config = raid_cfg()
+    return RestBudget(
+        raid_config.raid_rest_route_capacity,
+        raid_config.raid_rest_route_period,
+        raid_config.raid_rest_reserve,
+        raid_config.raid_rest_max_routes,
+    )
+
+
+@functools.cache
+def interaction_cache() -> ReplayCache:
+    raid_config = raid_cfg()
+    return ReplayCache(
+        raid_config.raid_interaction_ttl, raid_config.raid_interaction_cache_size
+    )
+
+
+@functools.cache
+def dm_dispatcher() -> DmDispatcher:
+    raid_config = raid_cfg()
+    return DmDispatcher(
+        plugin.client.rest,
+        rest_budget(),
+        raid_config.raid_dm_concurrency,
+        raid_config.raid_dm_queue_size,
+        raid_config.raid_dm_channel_cache_size,
+        raid_config.raid_dm_blocked_ttl,
+        raid_config.raid_dm_blocked_size,
+    )
+
+
+async def autocomplete_raid(
+    data: arc.AutocompleteData[arc.GatewayClient, str],
+) -> list[hikari.api.AutocompleteChoiceBuilder]:
+    if data.guild_id is None:
+        return []
+    now = int(datetime.now(UTC).timestamp())
+    with query_scope("raid.autocomplete", 1), db().sm.begin() as session:
+        raids = search_raids(session, data.guild_id, now, data.focused_value or "", 25)
+        return [
+            AutocompleteChoiceBuilder(
+                name=(
+                    f"{datetime.fromtimestamp(raid.when, UTC):%Y-%m-%d %H:%M} "
+                    f"{raid.title}"
+                )[:100],
+                value=str(raid.message_id),
+            )
+            for raid in raids
+        ]
+
+
+def fetch_raid_page(
+    kind: str,
+    guild_id: Snowflakeish,
+    user_id: Snowflakeish,
+    after: tuple[int, int] | None,
+) -> RaidPage:
+    raid_config = raid_cfg()
+    now = int(datetime.now(UTC).timestamp())
+    with query_scope("raid.list", 1), db().sm.begin() as session:
+        if kind == RAID_PAGE_USER:
+            return list_user_raids(
+                session,
+                guild_id,
+                user_id,
+                now,
+                after,
+                raid_config.raid_list_page_size,
+                raid_config.raid_list_cache_size,
+                raid_config.raid_list_cache_ttl,
+            )
+        return list_guild_raids(
+            session,
+            guild_id,
+            now,
+            after,
+            raid_config.raid_list_page_size,
+            raid_config.raid_list_cache_size,
+            raid_config.raid_list_cache_ttl,
+        )
+
+
+@traced("render raid_page")
+def build_raid_page(kind: str, guild_id: Snowflakeish, page: RaidPage) -> Components:
+    lines = [
+        f"<t:{raid.when}:F> {raid.title} "
+        f"{raid_message_link(guild_id, raid.channel_id, raid.message_id)} "
+        f"`{raid.message_id}`"
+        for raid in page.raids
+    ]
+    components: Components = [
+        TextDisplayComponentBuilder(content="\n".join(lines) or "No upcoming raids.")
+    ]
+    if page.has_more:
+        last = page.raids[-1]
+        components.append(
+            MessageActionRowBuilder(
+                components=[
+                    InteractiveButtonBuilder(
+                        custom_id=f"{kind}:{last.when}:{last.id}",
+                        label="Next",
+                        style=ButtonStyle.SECONDARY,
+                    )
+                ]
+            )
+        )
+    return components
+
+
+@raids_group.include
+@arc.slash_subcommand("list", "List the upcoming raids of this server.")
+async def _(ctx: GatewayContext) -> None:
+    if ctx.guild_id is None:
+        return
+    page = fetch_raid_page(RAID_PAGE_GUILD, ctx.guild_id, ctx.user.id, None)
+    await ctx.respond(
+        components=build_raid_page(RAID_PAGE_GUILD, ctx.guild_id, page),
+        flags=MessageFlag.EPHEMERAL,
+    )
+
+
+@raids_group.include
+@arc.slash_subcommand("mine", "List the upcoming raids you are signed up for.")
+async def _(ctx: GatewayContext) -> None:
+    if ctx.guild_id is None:
+        return
+    page = fetch_raid_page(RAID_PAGE_USER, ctx.guild_id, ctx.user.id, None)
+    await ctx.respond(
+        components=build_raid_page(RAID_PAGE_USER, ctx.guild_id, page),
+        flags=MessageFlag.EPHEMERAL,
+    )
 
-raid_scheduler = AsyncIOScheduler(
-    jobstores={
-        "default": SQLAlchemyJobStore(cfg().apscheduler.jobstore),
-        "memory": MemoryJobStore(),
-    },
-    timezone=UTC,
-)
+
+async def turn_raid_page(itx: hikari.ComponentInteraction) -> None:
+    if itx.guild_id is None:
+        return
+    kind, when, raid_id = itx.custom_id.rsplit(":", 2)
+    page = fetch_raid_page(kind, itx.guild_id, itx.user.id, (int(when), int(raid_id)))
+    async with rest_budget().slot(Priority.INTERACTION, INTERACTION_ROUTE):
+        await itx.create_initial_response(
+            ResponseType.MESSAGE_UPDATE,
+            components=build_raid_page(kind, itx.guild_id, page),
+        )
 
 
 @raid_group.include
@@ -103,6 +371,7 @@ async def _(
 ) -> None:
     if ctx.guild_id is None:
         return
+    guild_id = ctx.guild_id
     if when <= int(datetime.now(UTC).timestamp()):
         await ctx.respond(
             "\N{CROSS MARK} The raid time must be in the future.",
@@ -110,56 +379,308 @@ async def _(
         )
         return
     try:
-        try:
-            message = await plugin.client.rest.create_message(
+        starts_at = datetime.fromtimestamp(when, UTC)
+    except (ValueError, OverflowError, OSError) as e:
+        await ctx.respond(f"\N{CROSS MARK} {e}", flags=MessageFlag.EPHEMERAL)
+        return
+    try:
+        message_id = await post_raid_message(
+            guild_id,
+            ctx.channel_id,
+            host.id,
+            ingame_host_username,
+            ingame_host_uid,
+            when,
+            title,
+        )
+    except ForbiddenError:
+        await ctx.respond(
+            "\N{CROSS MARK} Missing `Send Messages` permission.",
+            flags=MessageFlag.EPHEMERAL,
+        )
+        return
+
+    def persist_raid() -> int:
+        with query_scope("raid.create", 5), db().sm.begin() as session:
+            return create_raid(
+                session,
+                guild_id,
                 ctx.channel_id,
-                components=build_raid_message(
-                    when,
-                    title,
-                    host.id,
-                    host_name=ingame_host_username,
-                    host_uid=ingame_host_uid,
-                    guild_id=ctx.guild_id,
-                    channel_id=ctx.channel_id,
-                ),
-                user_mentions=[host.id],
-            )
+                message_id,
+                host.id,
+                ingame_host_username,
+                ingame_host_uid,
+                when,
+                title,
+            ).id
+
+    try:
+        raid_id, thread_id = await open_raid_thread(
+            guild_id, ctx.channel_id, message_id, title, starts_at, persist_raid
+        )
+    except ForbiddenError:
+        await ctx.respond(
+            "\N{CROSS MARK} Missing `Create Public Threads` permission.",
+            flags=MessageFlag.EPHEMERAL,
+        )
+        return
+    except ValueError as e:
+        await ctx.respond(f"\N{CROSS MARK} {e}", flags=MessageFlag.EPHEMERAL)
+        return
+    invalidate_roster(raid_id)
+
+    # the command is deferred, so success is only reported once the raid is
+    # complete; a failed thread message rolls the raid back
+    try:
+        await post_initial_thread_message(
+            guild_id, ctx.channel_id, message_id, thread_id
+        )
+    except HTTPError as e:
+        await discard_raid(guild_id, ctx.channel_id, message_id, thread_id, True)
+        await ctx.respond(f"\N{CROSS MARK} {e}", flags=MessageFlag.EPHEMERAL)
+        return
+    await ctx.respond(
+        content="\N{WHITE HEAVY CHECK MARK}",
+        flags=MessageFlag.EPHEMERAL,
+    )
+
+
+async def post_raid_message(
+    guild_id: Snowflakeish,
+    channel_id: Snowflakeish,
+    host_discord_id: Snowflakeish,
+    host_username: str,
+    host_uid: str,
+    when: int,
+    title: str,
+) -> int:
+    components = build_raid_message(
+        when,
+        title,
+        int(host_discord_id),
+        host_name=host_username,
+        host_uid=host_uid,
+        guild_id=guild_id,
+        channel_id=channel_id,
+    )
+    async with rest_budget().slot(Priority.EDIT, channel_id):
+        message = await plugin.client.rest.create_message(
+            channel_id,
+            components=components,
+            user_mentions=[host_discord_id],
+        )
+    remember_fingerprint(message.id, fingerprint(components, [host_discord_id]))
+    return int(message.id)
+
+
+async def open_raid_thread[T](
+    guild_id: Snowflakeish,
+    channel_id: Snowflakeish,
+    message_id: Snowflakeish,
+    title: str,
+    starts_at: datetime,
+    persist: Callable[[], T],
+) -> tuple[T, int]:
+    async def create_thread() -> int:
+        async with rest_budget().slot(Priority.EDIT, channel_id):
             thread = await plugin.client.rest.create_message_thread(
-                ctx.channel_id,
-                message.id,
-                f"{title} @ {datetime.fromtimestamp(when, UTC).strftime('%Y-%m-%d %H:%M')} UTC",
+                channel_id,
+                message_id,
+                f"{title} @ {starts_at.strftime('%Y-%m-%d %H:%M')} UTC",
             )
-            await plugin.client.rest.create_message(
-                thread.id,
-                components=build_initial_thread_message(
-                    ctx.guild_id,
-                    ctx.channel_id,
-                    message.id,
-                ),
+        return int(thread.id)
+
+    # the row and its reminder are written on a worker thread while the
+    # thread is being created; callers invalidate the caches afterwards, on
+    # the event loop
+    thread_id, persisted = await asyncio.gather(
+        create_thread(), asyncio.to_thread(persist), return_exceptions=True
+    )
+    if isinstance(thread_id, BaseException) or isinstance(persisted, BaseException):
+        await discard_raid(
+            guild_id,
+            channel_id,
+            message_id,
+            None if isinstance(thread_id, BaseException) else thread_id,
+            not isinstance(persisted, BaseException),
+        )
+    if isinstance(thread_id, BaseException):
+        raise thread_id
+    if isinstance(persisted, BaseException):
+        raise persisted
+    return persisted, thread_id
+
+
+async def post_initial_thread_message(
+    guild_id: Snowflakeish,
+    channel_id: Snowflakeish,
+    message_id: Snowflakeish,
+    thread_id: Snowflakeish,
+) -> None:
+    async with rest_budget().slot(Priority.EDIT, thread_id):
+        await plugin.client.rest.create_message(
+            thread_id,
+            components=build_initial_thread_message(
+                guild_id,
+                channel_id,
+                message_id,
+            ),
+        )
+
+
+async def discard_raid(
+    guild_id: Snowflakeish,
+    channel_id: Snowflakeish,
+    message_id: Snowflakeish,
+    thread_id: Snowflakeish | None,
+    persisted: bool,
+) -> None:
+    if persisted:
+        with db().sm.begin() as session:
+            delete_raid_by_message_id(raid_scheduler(), session, guild_id, message_id)
+    if thread_id is not None:
+        try:
+            async with rest_budget().slot(Priority.EDIT, thread_id):
+                await plugin.client.rest.delete_channel(thread_id)
+        except NotFoundError:
+            pass
+    try:
+        async with rest_budget().slot(Priority.EDIT, channel_id):
+            await plugin.client.rest.delete_message(channel_id, message_id)
+    except NotFoundError:
+        pass
+
+
+@raid_group.include
+@arc.slash_subcommand("add", "Add a user to a raid.")
+async def _(
+    ctx: GatewayContext,
+    message_id: Option[
+        str, StrParams("the id of the raid.", autocomplete_with=autocomplete_raid)
+    ],
+    user: Option[hikari.User, UserParams("the user to add.")],
+    role: Option[
+        str,
+        StrParams(
+            "the role of the user (dps, tank, support).",
+            choices=[USER_ROLE_DPS, USER_ROLE_TANK, USER_ROLE_SUPPORT],
+        ),
+    ],
+    has_cleared: Option[
+        bool, BoolParams("whether the user has already cleared the raid.")
+    ],
+) -> None:
+    if ctx.guild_id is None:
+        return
+    try:
+        raid_message_id = int(message_id)
+    except ValueError:
+        await ctx.respond(
+            "\N{CROSS MARK} Invalid `message_id`.", flags=MessageFlag.EPHEMERAL
+        )
+        return
+    if role not in [USER_ROLE_DPS, USER_ROLE_TANK, USER_ROLE_SUPPORT]:
+        await ctx.respond(
+            "\N{CROSS MARK} Invalid role.",
+            flags=MessageFlag.EPHEMERAL,
+        )
+        return
+    try:
+        with query_scope("raid.add", 9), db().sm.begin() as session:
+            raid = get_raid_by_message_id(session, ctx.guild_id, raid_message_id)
+            raid_id = None
+
+            if raid is not None:
+                raid_id = raid.id
+
+                raid_user = get_raid_user_by_discord_id(session, raid.id, user.id)
+
+                if raid_user is not None:
+                    edit_raid_user(
+                        session, raid.id, user.id, role=role, has_cleared=has_cleared
+                    )
+                else:
+                    create_raid_user(
+                        session, raid.id, user.id, role=role, has_cleared=has_cleared
+                    )
+
+        if raid_id is not None:
+            await update_raid_message(raid_id)
+        else:
+            await ctx.respond(
+                "\N{CROSS MARK} Raid does not exist.",
+                flags=MessageFlag.EPHEMERAL,
             )
-        except ForbiddenError:
+    except ValueError as e:
+        await ctx.respond(f"\N{CROSS MARK} {e}", flags=MessageFlag.EPHEMERAL)
+        return
+    await ctx.respond(
+        content="\N{WHITE HEAVY CHECK MARK}",
+        flags=MessageFlag.EPHEMERAL,
+    )
+
+
+@raid_group.include
+@arc.slash_subcommand("remove", "Remove a user from a raid.")
+async def _(
+    ctx: GatewayContext,
+    message_id: Option[
+        str, StrParams("the id of the raid.", autocomplete_with=autocomplete_raid)
+    ],
+    user: Option[hikari.User, UserParams("the user to add.")],
+    reason: Option[str, StrParams("tell the user why you are removing them.")],
+) -> None:
+    if ctx.guild_id is None:
+        return
+    try:
+        raid_message_id = int(message_id)
+    except ValueError:
+        await ctx.respond(
+            "\N{CROSS MARK} Invalid `message_id`.", flags=MessageFlag.EPHEMERAL
+        )
+        return
+    try:
+        snapshot = None
+
+        with query_scope("raid.remove", 9), db().sm.begin() as session:
+            raid = get_raid_by_message_id(session, ctx.guild_id, raid_message_id)
+
+            if raid is not None:
+                raid_user = get_raid_user_by_discord_id(session, raid.id, user.id)
+
+                if raid_user is None:
+                    await ctx.respond(
+                        "\N{CROSS MARK} User is not part of this raid.",
+                        flags=MessageFlag.EPHEMERAL,
+                    )
+                    return
+
+                delete_raid_user_by_discord_id(session, raid.id, user.id)
+
+                snapshot = load_raid_snapshot(session, raid)
+
+        if snapshot is None:
             await ctx.respond(
-                "\N{CROSS MARK} Missing `Send Messages` permission.",
+                "\N{CROSS MARK} Raid does not exist.",
                 flags=MessageFlag.EPHEMERAL,
             )
             return
-        with db().sm.begin() as session:
-            try:
-                create_raid(
-                    raid_scheduler,
-                    session,
-                    ctx.guild_id,
-                    ctx.channel_id,
-                    message.id,
-                    host.id,
-                    ingame_host_username,
-                    ingame_host_uid,
-                    when,
-                    title,
-                )
-            except:
-                await plugin.client.rest.delete_message(ctx.channel_id, message.id)
-                raise
+
+        await update_raid_message(snapshot.id)
+
+        raid_user_remove_response = build_raid_removal_message(
+            snapshot.guild_id,
+            snapshot.channel_id,
+            snapshot.message_id,
+            reason,
+            snapshot.when,
+            snapshot.title,
+            snapshot.host_discord_id,
+            snapshot.users,
+            snapshot.host_username,
+            snapshot.host_uid,
+        )
+        dm_dispatcher().send(user.id, raid_user_remove_response)
     except ValueError as e:
         await ctx.respond(f"\N{CROSS MARK} {e}", flags=MessageFlag.EPHEMERAL)
         return
@@ -170,266 +691,556 @@ async def _(
 
 
 @raid_group.include
-@arc.slash_subcommand("add", "Add a user to a raid.")
+@arc.slash_subcommand("history", "Show the roster changes of a raid.")
 async def _(
     ctx: GatewayContext,
-    message_id: Option[str, StrParams("the id of the raid.")],
-    user: Option[hikari.User, UserParams("the user to add.")],
+    message_id: Option[
+        str, StrParams("the id of the raid.", autocomplete_with=autocomplete_raid)
+    ],
+) -> None:
+    if ctx.guild_id is None:
+        return
+    try:
+        raid_message_id = int(message_id)
+    except ValueError:
+        await ctx.respond(
+            "\N{CROSS MARK} Invalid `message_id`.", flags=MessageFlag.EPHEMERAL
+        )
+        return
+    with query_scope("raid.history", 2), db().sm.begin() as session:
+        raid = get_raid_by_message_id(session, ctx.guild_id, raid_message_id)
+        if raid is None:
+            await ctx.respond(
+                "\N{CROSS MARK} Raid does not exist.",
+                flags=MessageFlag.EPHEMERAL,
+            )
+            return
+        lines = [
+            format_raid_event(event)
+            for event in raid_history(
+                session, raid.id, None, raid_cfg().raid_history_page_size
+            )
+        ]
+    await ctx.respond(
+        content="\n".join(reversed(lines)) or "No roster changes.",
+        flags=MessageFlag.EPHEMERAL,
+    )
+
+
+def format_raid_event(event: model.RaidEvent) -> str:
+    match event.kind:
+        case EventKind.JOIN:
+            change = f"joined as {event.role}"
+        case EventKind.LEAVE:
+            change = "left"
+        case EventKind.ROLE:
+            change = f"switched to {event.role}"
+        case _:
+            change = "marked cleared" if event.has_cleared else "unmarked cleared"
+    return f"<t:{event.at}:f> <@{event.discord_id}> {change}"
+
+
+@raid_group.include
+@arc.slash_subcommand("stats", "Show attendance statistics.")
+async def _(
+    ctx: GatewayContext,
+    user: Option[
+        hikari.User | None, UserParams("the user to show statistics for.")
+    ] = None,
+) -> None:
+    if ctx.guild_id is None:
+        return
+    with query_scope("raid.stats", 2), db().sm.begin() as session:
+        roles = get_role_attendance(session, ctx.guild_id)
+        attendance = (
+            get_user_attendance(session, ctx.guild_id, user.id)
+            if user is not None
+            else None
+        )
+    lines = [
+        f"{role}: {stats.signups} sign-ups, {stats.clears} cleared, "
+        f"{stats.no_shows} no-shows"
+        for role, stats in sorted(roles.items())
+    ]
+    if user is not None and attendance is not None:
+        lines.insert(
+            0,
+            f"{user.mention}: {attendance.signups} sign-ups, "
+            f"{attendance.clears} cleared, {attendance.no_shows} no-shows",
+        )
+    await ctx.respond(
+        content="\n".join(lines) or "No statistics yet.",
+        flags=MessageFlag.EPHEMERAL,
+    )
+
+
+# user mentions, other mentions (roles, channels, emojis) to skip, or raw ids
+USER_IDS = re.compile(rf"{MENTION.pattern}|<[^>]*>|\b(\d{{15,20}})\b")
+
+
+def parse_user_ids(users: str) -> list[int]:
+    return list(
+        dict.fromkeys(
+            int(m[1] or m[2]) for m in USER_IDS.finditer(users) if m[1] or m[2]
+        )
+    )
+
+
+@raid_group.include
+@arc.slash_subcommand("add-many", "Add several users to a raid.")
+async def _(
+    ctx: GatewayContext,
+    message_id: Option[
+        str, StrParams("the id of the raid.", autocomplete_with=autocomplete_raid)
+    ],
+    users: Option[str, StrParams("the users to add (mentions or ids).")],
     role: Option[
         str,
         StrParams(
-            "the role of the user (dps, tank, support).",
+            "the role of the users (dps, tank, support).",
             choices=[USER_ROLE_DPS, USER_ROLE_TANK, USER_ROLE_SUPPORT],
         ),
     ],
-    has_cleared: Option[
-        bool, BoolParams("whether the user has already cleared the raid.")
+    has_cleared: Option[
+        bool, BoolParams("whether the users have already cleared the raid.")
+    ],
+) -> None:
+    if ctx.guild_id is None:
+        return
+    try:
+        raid_message_id = int(message_id)
+    except ValueError:
+        await ctx.respond(
+            "\N{CROSS MARK} Invalid `message_id`.", flags=MessageFlag.EPHEMERAL
+        )
+        return
+    discord_ids = parse_user_ids(users)
+    if not discord_ids:
+        await ctx.respond("\N{CROSS MARK} No users given.", flags=MessageFlag.EPHEMERAL)
+        return
+    if role not in [USER_ROLE_DPS, USER_ROLE_TANK, USER_ROLE_SUPPORT]:
+        await ctx.respond(
+            "\N{CROSS MARK} Invalid role.",
+            flags=MessageFlag.EPHEMERAL,
+        )
+        return
+    with query_scope("raid.add_many", 8), db().sm.begin() as session:
+        raid = get_raid_by_message_id(session, ctx.guild_id, raid_message_id)
+        if raid is None:
+            await ctx.respond(
+                "\N{CROSS MARK} Raid does not exist.",
+                flags=MessageFlag.EPHEMERAL,
+            )
+            return
+        raid_id = raid.id
+        set_raid_users(session, raid.id, discord_ids, role, has_cleared)
+
+    await update_raid_message(raid_id)
+    await ctx.respond(
+        content=f"\N{WHITE HEAVY CHECK MARK} Added {len(discord_ids)} users.",
+        flags=MessageFlag.EPHEMERAL,
+    )
+
+
+@raid_group.include
+@arc.slash_subcommand("remove-many", "Remove several users from a raid.")
+async def _(
+    ctx: GatewayContext,
+    message_id: Option[
+        str, StrParams("the id of the raid.", autocomplete_with=autocomplete_raid)
+    ],
+    users: Option[str, StrParams("the users to remove (mentions or ids).")],
+    reason: Option[str, StrParams("tell the users why you are removing them.")],
+) -> None:
+    if ctx.guild_id is None:
+        return
+    try:
+        raid_message_id = int(message_id)
+    except ValueError:
+        await ctx.respond(
+            "\N{CROSS MARK} Invalid `message_id`.", flags=MessageFlag.EPHEMERAL
+        )
+        return
+    discord_ids = parse_user_ids(users)
+    if not discord_ids:
+        await ctx.respond("\N{CROSS MARK} No users given.", flags=MessageFlag.EPHEMERAL)
+        return
+    with query_scope("raid.remove_many", 8), db().sm.begin() as session:
+        raid = get_raid_by_message_id(session, ctx.guild_id, raid_message_id)
+        if raid is None:
+            await ctx.respond(
+                "\N{CROSS MARK} Raid does not exist.",
+                flags=MessageFlag.EPHEMERAL,
+            )
+            return
+        removed = [
+            user.discord_id
+            for user in delete_raid_users_by_discord_ids(session, raid.id, discord_ids)
+        ]
+        snapshot = load_raid_snapshot(session, raid)
+
+    if removed:
+        await update_raid_message(snapshot.id)
+    raid_user_remove_response = build_raid_removal_message(
+        snapshot.guild_id,
+        snapshot.channel_id,
+        snapshot.message_id,
+        reason,
+        snapshot.when,
+        snapshot.title,
+        snapshot.host_discord_id,
+        snapshot.users,
+        snapshot.host_username,
+        snapshot.host_uid,
+    )
+    for discord_id in removed:
+        dm_dispatcher().send(discord_id, raid_user_remove_response)
+    await ctx.respond(
+        content=f"\N{WHITE HEAVY CHECK MARK} Removed {len(removed)} users.",
+        flags=MessageFlag.EPHEMERAL,
+    )
+
+
+async def copy_raid_roster(
+    ctx: GatewayContext,
+    source_message_id: str,
+    target_message_id: str,
+    move: bool,
+) -> None:
+    if ctx.guild_id is None:
+        return
+    try:
+        source_id, target_id = int(source_message_id), int(target_message_id)
+    except ValueError:
+        await ctx.respond(
+            "\N{CROSS MARK} Invalid `message_id`.", flags=MessageFlag.EPHEMERAL
+        )
+        return
+    if source_id == target_id:
+        await ctx.respond(
+            "\N{CROSS MARK} Source and target are the same raid.",
+            flags=MessageFlag.EPHEMERAL,
+        )
+        return
+    with query_scope("raid.copy", 12), db().sm.begin() as session:
+        source = get_raid_by_message_id(session, ctx.guild_id, source_id)
+        target = get_raid_by_message_id(session, ctx.guild_id, target_id)
+        if source is None or target is None:
+            await ctx.respond(
+                "\N{CROSS MARK} Raid does not exist.",
+                flags=MessageFlag.EPHEMERAL,
+            )
+            return
+        source_raid_id, target_raid_id = source.id, target.id
+        copied = len(copy_raid_users(session, source.id, target.id, move=move))
+    invalidate_roster(source_raid_id)
+    invalidate_roster(target_raid_id)
+
+    if move:
+        await update_raid_message(source_raid_id)
+    if copied:
+        await update_raid_message(target_raid_id)
+    verb = "Moved" if move else "Copied"
+    await ctx.respond(
+        content=f"\N{WHITE HEAVY CHECK MARK} {verb} {copied} users.",
+        flags=MessageFlag.EPHEMERAL,
+    )
+
+
+@raid_group.include
+@arc.slash_subcommand("copy", "Copy the roster of a raid to another raid.")
+async def _(
+    ctx: GatewayContext,
+    source_message_id: Option[
+        str,
+        StrParams(
+            "the id of the raid to copy from.", autocomplete_with=autocomplete_raid
+        ),
+    ],
+    target_message_id: Option[
+        str,
+        StrParams(
+            "the id of the raid to copy to.", autocomplete_with=autocomplete_raid
+        ),
+    ],
+) -> None:
+    await copy_raid_roster(ctx, source_message_id, target_message_id, move=False)
+
+
+@raid_group.include
+@arc.slash_subcommand("move", "Move the roster of a raid to another raid.")
+async def _(
+    ctx: GatewayContext,
+    source_message_id: Option[
+        str,
+        StrParams(
+            "the id of the raid to move from.", autocomplete_with=autocomplete_raid
+        ),
+    ],
+    target_message_id: Option[
+        str,
+        StrParams(
+            "the id of the raid to move to.", autocomplete_with=autocomplete_raid
+        ),
+    ],
+) -> None:
+    await copy_raid_roster(ctx, source_message_id, target_message_id, move=True)
+
+
+series_group = raid_group.include_subgroup("series", "Manage recurring raids.")
+
+
+@series_group.include
+@arc.slash_subcommand("create", "Create a recurring raid.")
+async def _(
+    ctx: GatewayContext,
+    host: Option[hikari.User, UserParams("the host of the raid.")],
+    ingame_host_username: Option[str, StrParams("the in-game username of the host.")],
+    ingame_host_uid: Option[str, StrParams("the in-game uid of the host.")],
+    when: Option[
+        int,
+        IntParams(
+            "the time when the first raid will start (timestamp in seconds, use hammertime.cyou)."
+        ),
+    ],
+    title: Option[
+        str, StrParams("the title of the raid announcement (e.g. All raids, Light NM).")
     ],
+    every_days: Option[
+        int, IntParams("the number of days between raids (e.g. 7).", min=1)
+    ] = 7,
+    carry_roster: Option[
+        bool, BoolParams("whether each raid starts with the previous roster.")
+    ] = False,
 ) -> None:
     if ctx.guild_id is None:
         return
-    try:
-        message_id: int = int(message_id)
-    except ValueError:
-        await ctx.respond(
-            "\N{CROSS MARK} Invalid `message_id`.", flags=MessageFlag.EPHEMERAL
-        )
-        return
-    if role not in [USER_ROLE_DPS, USER_ROLE_TANK, USER_ROLE_SUPPORT]:
+    if when <= int(datetime.now(UTC).timestamp()):
         await ctx.respond(
-            "\N{CROSS MARK} Invalid role.",
+            "\N{CROSS MARK} The raid time must be in the future.",
             flags=MessageFlag.EPHEMERAL,
         )
         return
-    try:
-        with db().sm.begin() as session:
-            raid = get_raid_by_message_id(session, ctx.guild_id, message_id)
-            raid_id = None
-
-            if raid is not None:
-                raid_id = raid.id
-
-                raid_user = get_raid_user_by_discord_id(session, raid.id, user.id)
-
-                if raid_user is not None:
-                    edit_raid_user(
-                        session, raid.id, user.id, role=role, has_cleared=has_cleared
-                    )
-                else:
-                    create_raid_user(
-                        session, raid.id, user.id, role=role, has_cleared=has_cleared
-                    )
-
-        if raid_id is not None:
-            await update_raid_message(raid_id)
-        else:
-            await ctx.respond(
-                "\N{CROSS MARK} Raid does not exist.",
-                flags=MessageFlag.EPHEMERAL,
+    with query_scope("raid.series_create", 3), db().sm.begin() as session:
+        try:
+            series = create_series(
+                raid_scheduler(),
+                session,
+                ctx.guild_id,
+                ctx.channel_id,
+                host.id,
+                ingame_host_username,
+                ingame_host_uid,
+                when,
+                title,
+                every_days * 86400,
+                carry_roster,
             )
-    except ValueError as e:
-        await ctx.respond(f"\N{CROSS MARK} {e}", flags=MessageFlag.EPHEMERAL)
-        return
+        except (ValueError, OverflowError, OSError) as e:
+            await ctx.respond(f"\N{CROSS MARK} {e}", flags=MessageFlag.EPHEMERAL)
+            return
+        series_id = series.id
     await ctx.respond(
-        content="\N{WHITE HEAVY CHECK MARK}",
+        content=f"\N{WHITE HEAVY CHECK MARK} Created series {series_id}.",
         flags=MessageFlag.EPHEMERAL,
     )
 
 
-@raid_group.include
-@arc.slash_subcommand("remove", "Remove a user from a raid.")
+@series_group.include
+@arc.slash_subcommand("delete", "Stop a recurring raid.")
 async def _(
     ctx: GatewayContext,
-    message_id: Option[str, StrParams("the id of the raid.")],
-    user: Option[hikari.User, UserParams("the user to add.")],
-    reason: Option[str, StrParams("tell the user why you are removing them.")],
+    series_id: Option[int, IntParams("the id of the series.")],
 ) -> None:
     if ctx.guild_id is None:
         return
-    try:
-        message_id: int = int(message_id)
-    except ValueError:
-        await ctx.respond(
-            "\N{CROSS MARK} Invalid `message_id`.", flags=MessageFlag.EPHEMERAL
-        )
-        return
-    try:
-        raid_user_remove_response = None
-
-        with db().sm.begin() as session:
-            raid = get_raid_by_message_id(session, ctx.guild_id, message_id)
-            raid_id = None
+    with db().sm.begin() as session:
+        try:
+            delete_series(raid_scheduler(), session, ctx.guild_id, series_id)
+        except IndexError as e:
+            await ctx.respond(f"\N{CROSS MARK} {e}", flags=MessageFlag.EPHEMERAL)
+            return
+    await ctx.respond(
+        content="\N{WHITE HEAVY CHECK MARK}",
+        flags=MessageFlag.EPHEMERAL,
+    )
 
-            if raid is not None:
-                raid_id = raid.id
-                raid_user = get_raid_user_by_discord_id(session, raid.id, user.id)
 
-                if raid_user is None:
-                    await ctx.respond(
-                        "\N{CROSS MARK} User is not part of this raid.",
-                        flags=MessageFlag.EPHEMERAL,
-                    )
-                    return
+@series_group.include
+@arc.slash_subcommand("list", "List the recurring raids of this server.")
+async def _(ctx: GatewayContext) -> None:
+    if ctx.guild_id is None:
+        return
+    with query_scope("raid.series_list", 1), db().sm.begin() as session:
+        lines = [
+            f"{series.id}: {series.title} <t:{series.next_when}:F>, "
+            f"every {series.period // 86400} days in <#{series.channel_id}>"
+            for series in get_guild_series(session, ctx.guild_id)
+        ]
+    await ctx.respond(
+        content="\n".join(lines) or "No recurring raids.",
+        flags=MessageFlag.EPHEMERAL,
+    )
 
-                delete_raid_user_by_discord_id(session, raid.id, user.id)
 
-                raid_user_remove_response = build_raid_removal_message(
-                    raid.guild_id,
-                    raid.channel_id,
-                    raid.message_id,
-                    reason,
-                    raid.when,
-                    raid.title,
-                    raid.id,
-                    raid.users,
-                    raid.host_username,
-                    raid.host_uid,
-                )
-
-        if raid_user_remove_response is None:
-            await ctx.respond(
-                "\N{CROSS MARK} Raid does not exist.",
-                flags=MessageFlag.EPHEMERAL,
-            )
+@traced("job open_series_raid")
+async def open_series_raid(series_id: int) -> None:
+    now = int(datetime.now(UTC).timestamp())
+    with query_scope("raid.series_open", 1), db().sm.begin() as session:
+        series = get_series_by_id(session, series_id)
+        if series is None:
             return
+        when = next_occurrence(series, now)
+        guild_id = series.guild_id
+        channel_id = series.channel_id
+        host_discord_id = series.host_discord_id
+        host_username = series.host_username
+        host_uid = series.host_uid
+        title = series.title
+
+    def skip_occurrence(e: Exception) -> None:
+        logger.warning("Skipping raid of series %d at %d: %s", series_id, when, e)
+        with db().sm.begin() as session:
+            series = get_series_by_id(session, series_id)
+            if series is not None and series.next_when <= when:
+                advance_series(raid_scheduler(), series, when)
 
-        if raid_id is not None:
-            await update_raid_message(raid_id)
-
-        try:
-            dm_channel = await plugin.client.rest.create_dm_channel(user.id)
+    try:
+        message_id = await post_raid_message(
+            guild_id, channel_id, host_discord_id, host_username, host_uid, when, title
+        )
+    except (ForbiddenError, NotFoundError) as e:
+        logger.warning("Deleting series %d: %s", series_id, e)
+        with db().sm.begin() as session:
+            delete_series(raid_scheduler(), session, guild_id, series_id)
+        return
+    except Exception as e:
+        skip_occurrence(e)
+        return
 
-            await plugin.client.rest.create_message(
-                dm_channel.id,
-                components=raid_user_remove_response,
+    def persist_raid() -> tuple[int, int]:
+        with query_scope("raid.series_materialize", 14), db().sm.begin() as session:
+            series = get_series_by_id(session, series_id)
+            if series is None:
+                raise IndexError("Series does not exist.")
+            raid, carried = materialize_series(
+                raid_scheduler(), session, series, when, message_id
             )
-        except Exception as e:
-            print(f"Failed to send DM to {user.id}: {e}")
-            pass
-    except ValueError as e:
-        await ctx.respond(f"\N{CROSS MARK} {e}", flags=MessageFlag.EPHEMERAL)
+            return raid.id, carried
+
+    try:
+        (raid_id, carried), thread_id = await open_raid_thread(
+            guild_id,
+            channel_id,
+            message_id,
+            title,
+            datetime.fromtimestamp(when, UTC),
+            persist_raid,
+        )
+    except Exception as e:
+        skip_occurrence(e)
         return
-    await ctx.respond(
-        content="\N{WHITE HEAVY CHECK MARK}",
-        flags=MessageFlag.EPHEMERAL,
-    )
+    invalidate_roster(raid_id)
+    try:
+        await post_initial_thread_message(guild_id, channel_id, message_id, thread_id)
+    except Exception as e:
+        logger.warning("Failed to open raid for series %d: %s", series_id, e)
+        await discard_raid(guild_id, channel_id, message_id, thread_id, True)
+        return
+
+    if carried:
+        await update_raid_message(raid_id)
+
+
+async def series_loop() -> None:
+    limit = raid_cfg().raid_series_queue_size
+    while True:
+        series_id = await series_queue().get()
+        while len(series_tasks) >= limit:
+            await asyncio.wait(series_tasks, return_when=asyncio.FIRST_COMPLETED)
+        spawn(series_tasks, open_series_raid(series_id), series_id)
 
 
 async def update_raid_message(
     raid_id: int,
 ):
-    with db().sm.begin() as session:
-        raid = get_raid_by_raid_id(session, raid_id)
+    with query_scope("raid.update_message", 2), db().sm.begin() as session:
+        raid = get_raid_snapshot(session, raid_id)
 
-        if raid is None:
-            return
+    if raid is None:
+        return
 
-        channel_id = raid.channel_id
-        message_id = raid.message_id
-        raid_message = build_raid_message(
-            raid.when,
-            raid.title,
-            raid.host_discord_id,
-            raid.users,
-            raid.host_username,
-            raid.host_uid,
-            raid.guild_id,
-            raid.channel_id,
-            raid.message_id,
-        )
-        user_mentions = [raid.host_discord_id] + [
-            user.discord_id for user in raid.users
-        ]
+    components = build_raid_message(
+        raid.when,
+        raid.title,
+        raid.host_discord_id,
+        raid.users,
+        raid.host_username,
+        raid.host_uid,
+        raid.guild_id,
+        raid.channel_id,
+        raid.message_id,
+    )
+    digest = fingerprint(components, raid.user_mentions())
+    if is_unchanged(raid.message_id, digest):
+        return
 
     try:
-        await plugin.client.rest.edit_message(
-            channel_id, message_id, components=raid_message, user_mentions=user_mentions
-        )
+        async with rest_budget().slot(Priority.EDIT, raid.channel_id):
+            await plugin.client.rest.edit_message(
+                raid.channel_id,
+                raid.message_id,
+                components=components,
+                user_mentions=raid.user_mentions(),
+            )
     except NotFoundError:
+        forget_fingerprint(raid.message_id)
         with db().sm.begin() as session:
             delete_raid_by_message_id(
-                raid_scheduler, session, raid.guild_id, raid.message_id
+                raid_scheduler(), session, raid.guild_id, raid.message_id
             )
         return
+    remember_fingerprint(raid.message_id, digest)
+
+
+def guild_raid_templates(guild_id: Snowflakeish | None) -> RaidTemplates:
+    if guild_id is None:
+        return raid_templates()
+    templates = cached_guild_templates(int(guild_id))
+    if templates is None:
+        with query_scope("raid.load_templates", 1), db().sm.begin() as session:
+            templates = load_guild_templates(session, int(guild_id))
+    return templates
 
 
+@traced("render raid_message")
 def build_raid_message(
     when: int,
     title: str,
     host_discord_id: int,
-    users: list[model.RaidUser] | None = None,
+    users: Sequence[RaidUserSnapshot] | None = None,
     host_name: str | None = None,
     host_uid: str | None = None,
     guild_id: Snowflakeish | None = None,
     channel_id: Snowflakeish | None = None,
     message_id: Snowflakeish | None = None,
 ) -> Components:
-    raid_config = raid_cfg()
-
-    users = users or []
-
-    def filter_users(
-        players: list[model.RaidUser], role: str, has_cleared: bool
-    ) -> list[model.RaidUser]:
-        return list(
-            filter(lambda u: u.role == role and u.has_cleared == has_cleared, players)
-        )
-
-    def format_user(u: model.RaidUser) -> str:
-        return f"<@{u.discord_id}>"
-
-    dps_need_clear_list = filter_users(users, USER_ROLE_DPS, False)
-    dps_cleared_list = filter_users(users, USER_ROLE_DPS, True)
-    tank_need_clear_list = filter_users(users, USER_ROLE_TANK, False)
-    tank_cleared_list = filter_users(users, USER_ROLE_TANK, True)
-    support_need_clear_list = filter_users(users, USER_ROLE_SUPPORT, False)
-    support_cleared_list = filter_users(users, USER_ROLE_SUPPORT, True)
-
-    dps_need_clear = " ".join(format_user(user) for user in dps_need_clear_list)
-    dps_cleared = " ".join(format_user(user) for user in dps_cleared_list)
-    dps_separator = raid_config.emoji.has_cleared if dps_cleared else ""
-    tank_need_clear = " ".join(format_user(user) for user in tank_need_clear_list)
-    tank_cleared = " ".join(format_user(user) for user in tank_cleared_list)
-    tank_separator = raid_config.emoji.has_cleared if tank_cleared else ""
-    support_need_clear = " ".join(format_user(user) for user in support_need_clear_list)
-    support_cleared = " ".join(format_user(user) for user in support_cleared_list)
-    support_separator = raid_config.emoji.has_cleared if support_cleared else ""
-
-    total_users = len(users)
-    total_dps = len(dps_need_clear_list) + len(dps_cleared_list)
-    total_tank = len(tank_need_clear_list) + len(tank_cleared_list)
-    total_support = len(support_need_clear_list) + len(support_cleared_list)
-    total_cleared = (
-        len(dps_cleared_list) + len(tank_cleared_list) + len(support_cleared_list)
+    templates = guild_raid_templates(guild_id)
+
+    template_values = build_template_values(
+        templates.config,
+        when,
+        title,
+        host_discord_id,
+        users or [],
+        host_name,
+        host_uid,
+        guild_id,
+        channel_id,
+        message_id,
     )
 
-    template_values: dict[str, object] = {
-        "when": when,
-        "title": title,
-        "host_mention": f"<@{host_discord_id}>",
-        "host_username": host_name,
-        "host_uid": host_uid,
-        "dps_emoji": raid_config.emoji.dps,
-        "tank_emoji": raid_config.emoji.tank,
-        "support_emoji": raid_config.emoji.support,
-        "has_cleared_emoji": raid_config.emoji.has_cleared,
-        "dps_need_clear": dps_need_clear,
-        "dps_separator": dps_separator,
-        "dps_cleared": dps_cleared,
-        "tank_need_clear": tank_need_clear,
-        "tank_separator": tank_separator,
-        "tank_cleared": tank_cleared,
-        "support_need_clear": support_need_clear,
-        "support_separator": support_separator,
-        "support_cleared": support_cleared,
-        "total": total_users,
-        "dps_total": total_dps,
-        "tank_total": total_tank,
-        "support_total": total_support,
-        "total_cleared": total_cleared,
-    }
-
-    message = raid_config.raid_message_template.format_map(template_values)
+    message = templates.config.raid_message_template.format_map(template_values)
 
     components = [
         TextDisplayComponentBuilder(content=message),
@@ -437,31 +1248,31 @@ def build_raid_message(
             components=[
                 InteractiveButtonBuilder(
                     custom_id=RAID_ROLE_DPS,
-                    label=total_dps,
-                    emoji=Emoji.parse(raid_config.emoji.dps),
+                    label=template_values["dps_total"],
+                    emoji=templates.dps_emoji,
                     style=ButtonStyle.SECONDARY,
                 ),
                 InteractiveButtonBuilder(
                     custom_id=RAID_ROLE_TANK,
-                    label=total_tank,
-                    emoji=Emoji.parse(raid_config.emoji.tank),
+                    label=template_values["tank_total"],
+                    emoji=templates.tank_emoji,
                     style=ButtonStyle.SECONDARY,
                 ),
                 InteractiveButtonBuilder(
                     custom_id=RAID_ROLE_SUPPORT,
-                    label=total_support,
-                    emoji=Emoji.parse(raid_config.emoji.support),
+                    label=template_values["support_total"],
+                    emoji=templates.support_emoji,
                     style=ButtonStyle.SECONDARY,
                 ),
                 InteractiveButtonBuilder(
                     custom_id=RAID_CLEARED,
-                    label=total_cleared,
-                    emoji=Emoji.parse(raid_config.emoji.has_cleared),
+                    label=template_values["total_cleared"],
+                    emoji=templates.has_cleared_emoji,
                     style=ButtonStyle.SECONDARY,
                 ),
                 InteractiveButtonBuilder(
                     custom_id=RAID_SIGNOFF,
-                    emoji=Emoji.parse(raid_config.emoji.sign_off),
+                    emoji=templates.sign_off_emoji,
                     style=ButtonStyle.SECONDARY,
                 ),
             ]
@@ -471,6 +1282,7 @@ def build_raid_message(
     return components
 
 
+@traced("render raid_ping")
 def build_raid_ping(
     guild_id: Snowflakeish,
     channel_id: Snowflakeish,
@@ -478,83 +1290,43 @@ def build_raid_ping(
     when: int,
     title: str,
     host_discord_id: int,
-    users: list[model.RaidUser] | None = None,
+    users: Sequence[RaidUserSnapshot] | None = None,
     host_name: str | None = None,
     host_uid: str | None = None,
-) -> Components:
-    raid_config = raid_cfg()
-
-    users = users or []
-
-    def filter_users(
-        userlist: list[model.RaidUser], role: str, has_cleared: bool
-    ) -> list[model.RaidUser]:
-        return list(
-            filter(
-                lambda u: u.role == role
-                and (has_cleared is None or u.has_cleared == has_cleared),
-                userlist,
-            )
-        )
-
-    def format_user(u: model.RaidUser) -> str:
-        return f"<@{u.discord_id}>"
-
-    dps_need_clear_list = filter_users(users, USER_ROLE_DPS, False)
-    dps_cleared_list = filter_users(users, USER_ROLE_DPS, True)
-    tank_need_clear_list = filter_users(users, USER_ROLE_TANK, False)
-    tank_cleared_list = filter_users(users, USER_ROLE_TANK, True)
-    support_need_clear_list = filter_users(users, USER_ROLE_SUPPORT, False)
-    support_cleared_list = filter_users(users, USER_ROLE_SUPPORT, True)
-
-    raid_users = " ".join(format_user(user) for user in users)
-    dps_need_clear = " ".join(format_user(user) for user in dps_need_clear_list)
-    dps_cleared = " ".join(format_user(user) for user in dps_cleared_list)
-    dps_separator = raid_config.emoji.has_cleared if dps_cleared else ""
-    tank_need_clear = " ".join(format_user(user) for user in tank_need_clear_list)
-    tank_cleared = " ".join(format_user(user) for user in tank_cleared_list)
-    tank_separator = raid_config.emoji.has_cleared if tank_cleared else ""
-    support_need_clear = " ".join(format_user(user) for user in support_need_clear_list)
-    support_cleared = " ".join(format_user(user) for user in support_cleared_list)
-    support_separator = raid_config.emoji.has_cleared if support_cleared else ""
-
-    total_users = len(users)
-    total_dps = len(dps_need_clear_list) + len(dps_cleared_list)
-    total_tank = len(tank_need_clear_list) + len(tank_cleared_list)
-    total_support = len(support_need_clear_list) + len(support_cleared_list)
-    total_cleared = (
-        len(dps_cleared_list) + len(tank_cleared_list) + len(support_cleared_list)
+    lead: int = 0,
+) -> list[tuple[Components, list[int]]]:
+    templates = guild_raid_templates(guild_id)
+
+    template_values = build_template_values(
+        templates.config,
+        when,
+        title,
+        host_discord_id,
+        users or [],
+        host_name,
+        host_uid,
+        guild_id,
+        channel_id,
+        message_id,
     )
 
-    template_values: dict[str, object] = {
-        "when": when,
-        "title": title,
-        "host_mention": f"<@{host_discord_id}>",
-        "host_username": host_name,
-        "host_uid": host_uid,
-        "dps_emoji": raid_config.emoji.dps,
-        "tank_emoji": raid_config.emoji.tank,
-        "support_emoji": raid_config.emoji.support,
-        "has_cleared_emoji": raid_config.emoji.has_cleared,
-        "dps_users": f"{dps_need_clear} {dps_separator} {dps_cleared}",
-        "tank_users": f"{tank_need_clear} {tank_separator} {tank_cleared}",
-        "support_users": f"{support_need_clear} {support_separator} {support_cleared}",
-        "users": raid_users,
-        "raid_message_link": f"https://discord.com/channels/{guild_id}/{channel_id}/{message_id}",
-        "total": total_users,
-        "dps_total": total_dps,
-        "tank_total": total_tank,
-        "support_total": total_support,
-        "total_cleared": total_cleared,
-    }
+    template_values["lead"] = format_lead(lead)
 
-    message = raid_config.raid_ping_template.format_map(template_values)
+    message = templates.config.raid_ping_template.format_map(template_values)
 
-    components = [TextDisplayComponentBuilder(content=message)]
+    chunks = split_mentions(
+        message,
+        templates.config.raid_ping_max_length,
+        templates.config.raid_ping_max_mentions,
+    )
 
-    return components
+    return [
+        ([TextDisplayComponentBuilder(content=content)], mentions)
+        for content, mentions in chunks
+    ]
 
 
+@traced("render raid_removal_message")
 def build_raid_removal_message(
     guild_id: Snowflakeish,
     channel_id: Snowflakeish,
@@ -563,96 +1335,46 @@ def build_raid_removal_message(
     when: int,
     title: str,
     host_discord_id: int,
-    users: list[model.RaidUser] | None = None,
+    users: Sequence[RaidUserSnapshot] | None = None,
     host_name: str | None = None,
     host_uid: str | None = None,
 ) -> Components:
-    raid_config = raid_cfg()
-
-    users = users or []
-
-    def filter_users(
-        userlist: list[model.RaidUser], role: str, has_cleared: bool
-    ) -> list[model.RaidUser]:
-        return list(
-            filter(
-                lambda u: u.role == role
-                and (has_cleared is None or u.has_cleared == has_cleared),
-                userlist,
-            )
-        )
-
-    def format_user(u: model.RaidUser) -> str:
-        return f"<@{u.discord_id}>"
-
-    dps_need_clear_list = filter_users(users, USER_ROLE_DPS, False)
-    dps_cleared_list = filter_users(users, USER_ROLE_DPS, True)
-    tank_need_clear_list = filter_users(users, USER_ROLE_TANK, False)
-    tank_cleared_list = filter_users(users, USER_ROLE_TANK, True)
-    support_need_clear_list = filter_users(users, USER_ROLE_SUPPORT, False)
-    support_cleared_list = filter_users(users, USER_ROLE_SUPPORT, True)
-
-    raid_users = " ".join(format_user(user) for user in users)
-    dps_need_clear = " ".join(format_user(user) for user in dps_need_clear_list)
-    dps_cleared = " ".join(format_user(user) for user in dps_cleared_list)
-    dps_separator = raid_config.emoji.has_cleared if dps_cleared else ""
-    tank_need_clear = " ".join(format_user(user) for user in tank_need_clear_list)
-    tank_cleared = " ".join(format_user(user) for user in tank_cleared_list)
-    tank_separator = raid_config.emoji.has_cleared if tank_cleared else ""
-    support_need_clear = " ".join(format_user(user) for user in support_need_clear_list)
-    support_cleared = " ".join(format_user(user) for user in support_cleared_list)
-    support_separator = raid_config.emoji.has_cleared if support_cleared else ""
-
-    total_users = len(users)
-    total_dps = len(dps_need_clear_list) + len(dps_cleared_list)
-    total_tank = len(tank_need_clear_list) + len(tank_cleared_list)
-    total_support = len(support_need_clear_list) + len(support_cleared_list)
-    total_cleared = (
-        len(dps_cleared_list) + len(tank_cleared_list) + len(support_cleared_list)
+    templates = guild_raid_templates(guild_id)
+
+    template_values = build_template_values(
+        templates.config,
+        when,
+        title,
+        host_discord_id,
+        users or [],
+        host_name,
+        host_uid,
+        guild_id,
+        channel_id,
+        message_id,
     )
+    template_values["raid_removal_reason"] = raid_removal_reason
 
-    template_values: dict[str, object] = {
-        "when": when,
-        "title": title,
-        "host_mention": f"<@{host_discord_id}>",
-        "host_username": host_name,
-        "host_uid": host_uid,
-        "dps_emoji": raid_config.emoji.dps,
-        "tank_emoji": raid_config.emoji.tank,
-        "support_emoji": raid_config.emoji.support,
-        "has_cleared_emoji": raid_config.emoji.has_cleared,
-        "dps_users": f"{dps_need_clear} {dps_separator} {dps_cleared}",
-        "tank_users": f"{tank_need_clear} {tank_separator} {tank_cleared}",
-        "support_users": f"{support_need_clear} {support_separator} {support_cleared}",
-        "users": raid_users,
-        "raid_message_link": f"https://discord.com/channels/{guild_id}/{channel_id}/{message_id}",
-        "total": total_users,
-        "dps_total": total_dps,
-        "tank_total": total_tank,
-        "support_total": total_support,
-        "total_cleared": total_cleared,
-        "raid_removal_reason": raid_removal_reason,
-    }
-
-    message = raid_config.raid_removal_dm_template.format_map(template_values)
+    message = templates.config.raid_removal_dm_template.format_map(template_values)
 
     components = [TextDisplayComponentBuilder(content=message)]
 
     return components
 
 
+@traced("render initial_thread_message")
 def build_initial_thread_message(
     guild_id: Snowflakeish,
     channel_id: Snowflakeish,
     message_id: Snowflakeish,
 ) -> Components:
-    raid_config = raid_cfg()
+    templates = guild_raid_templates(guild_id)
 
     template_values: dict[str, object] = {
-        "raid_message_link": f"https://discord.com/channels/{guild_id}/{channel_id}/{message_id}",
+        "raid_message_link": raid_message_link(guild_id, channel_id, message_id),
     }
 
-    message = raid_config.raid_initial_thread_message_template.format_map(
+    message = templates.config.raid_initial_thread_message_template.format_map(
         template_values
     )
 
@@ -664,15 +1386,43 @@ def build_initial_thread_message(
 @plugin.listen()
 async def _(event: ComponentInteractionCreateEvent):
     itx = event.interaction
+    # a resumed gateway session or a client retry can deliver the same
+    # interaction twice; replays are dropped before any db work
+    age = datetime.now(UTC) - itx.id.created_at
+    if age.total_seconds() > raid_cfg().raid_interaction_ttl:
+        return
+    if not interaction_cache().check(itx.id):
+        return
+    with tracer().trace(
+        "interaction component", **{"discord.custom_id": itx.custom_id}
+    ):
+        await handle_component(itx)
+
+
+async def handle_component(itx: hikari.ComponentInteraction) -> None:
+    if itx.custom_id.startswith(RAID_PAGE_PREFIX):
+        await turn_raid_page(itx)
+        return
 
     if itx.guild_id is None or itx.member is None:
         return
     if itx.message is None:
         return
 
+    if itx.custom_id == RAID_CLEARED:
+        # the cleared button targets the opposite of the state the clicked
+        # message showed, so repeated clicks on the same render (double clicks,
+        # client retries, redelivery) toggle only once
+        version = itx.message.edited_timestamp or itx.message.timestamp
+        if not interaction_cache().check(
+            (RAID_CLEARED, itx.message.id, itx.member.id, version)
+        ):
+            await itx.create_initial_response(ResponseType.DEFERRED_MESSAGE_UPDATE)
+            return
+
     error = None
 
-    with db().sm.begin() as session:
+    with query_scope("raid.click", 9), db().sm.begin() as session:
         raid = get_raid_by_message_id(session, itx.guild_id, itx.message.id)
 
         if raid is None:
@@ -701,36 +1451,24 @@ async def _(event: ComponentInteractionCreateEvent):
                         role=itx.custom_id[len(RAID_ROLE_PREFIX) + 1 :],
                     )
                 elif itx.custom_id == RAID_CLEARED:
+                    has_cleared = not user.has_cleared
                     edit_raid_user(
                         session,
                         raid.id,
                         user.discord_id,
-                        has_cleared=not user.has_cleared,
+                        has_cleared=has_cleared,
                     )
                 elif itx.custom_id == RAID_SIGNOFF:
                     delete_raid_user_by_discord_id(session, raid.id, user.discord_id)
                 else:
-                    error = ("\N{CROSS MARK} Invalid action!",)
+                    error = "\N{CROSS MARK} Invalid action!"
         except ValueError as e:
-            print(f"Failed to update raid user: {e}")
+            logger.debug("Failed to update raid user: %s", e)
             return
         except IndexError as e:
-            print(f"Failed to update raid user: {e}")
+            logger.debug("Failed to update raid user: %s", e)
             return
-        raid_message = build_raid_message(
-            raid.when,
-            raid.title,
-            raid.host_discord_id,
-            raid.users,
-            raid.host_username,
-            raid.host_uid,
-            raid.guild_id,
-            raid.channel_id,
-            raid.message_id,
-        )
-        user_mentions = [raid.host_discord_id] + [
-            user.discord_id for user in raid.users
-        ]
+        snapshot = load_raid_snapshot(session, raid)
 
     if error is not None:
         await itx.create_initial_response(
@@ -740,17 +1478,37 @@ async def _(event: ComponentInteractionCreateEvent):
         )
         return
 
-    await itx.create_initial_response(
-        ResponseType.MESSAGE_UPDATE,
-        components=raid_message,
-        user_mentions=user_mentions,
+    raid_message = build_raid_message(
+        snapshot.when,
+        snapshot.title,
+        snapshot.host_discord_id,
+        snapshot.users,
+        snapshot.host_username,
+        snapshot.host_uid,
+        snapshot.guild_id,
+        snapshot.channel_id,
+        snapshot.message_id,
     )
+    digest = fingerprint(raid_message, snapshot.user_mentions())
+
+    async with rest_budget().slot(Priority.INTERACTION, INTERACTION_ROUTE):
+        # a click that changes nothing is acknowledged without a payload
+        if is_unchanged(snapshot.message_id, digest):
+            await itx.create_initial_response(ResponseType.DEFERRED_MESSAGE_UPDATE)
+            return
+        await itx.create_initial_response(
+            ResponseType.MESSAGE_UPDATE,
+            components=raid_message,
+            user_mentions=snapshot.user_mentions(),
+        )
+    remember_fingerprint(snapshot.message_id, digest)
 
 
+@traced("job cleanup_deleted_raids")
 async def cleanup_deleted_raids():
     to_be_deleted = []
 
-    with db().sm.begin() as session:
+    with query_scope("raid.cleanup"), db().sm.begin() as session:
         raids = get_all_raids(session)
 
         for raid in raids:
@@ -762,79 +1520,406 @@ async def cleanup_deleted_raids():
                 }
             )
 
-    for raid in to_be_deleted:
-        try:
-            await plugin.client.rest.fetch_message(
-                raid["channel_id"], raid["message_id"]
-            )
-        except NotFoundError:
-            with db().sm.begin() as session:
-                delete_raid_by_message_id(
-                    raid_scheduler, session, raid["guild_id"], raid["message_id"]
-                )
-        except ForbiddenError:
-            continue
+    semaphore = asyncio.Semaphore(raid_cfg().raid_cleanup_concurrency)
+
+    async def check(raid: dict[str, int]) -> None:
+        async with semaphore:
+            try:
+                async with rest_budget().slot(Priority.LIVENESS, raid["channel_id"]):
+                    await plugin.client.rest.fetch_message(
+                        raid["channel_id"], raid["message_id"]
+                    )
+            except NotFoundError:
+                with db().sm.begin() as session:
+                    delete_raid_by_message_id(
+                        raid_scheduler(),
+                        session,
+                        raid["guild_id"],
+                        raid["message_id"],
+                    )
+            except ForbiddenError:
+                return
+
+    await asyncio.gather(*(check(raid) for raid in to_be_deleted))
+
+    global liveness_swept_at
+    liveness_swept_at = time.time()
 
 
+@traced("job raid_ping")
 async def raid_ping(raid_id: int) -> None:
-    with db().sm.begin() as session:
+    with query_scope("raid.ping", 2), db().sm.begin() as session:
         try:
-            raid_scheduler.remove_job(f"{raid_id}")
+            raid_scheduler().remove_job(f"{raid_id}")
         except JobLookupError:
             pass
 
-        raid = session.get(model.Raid, raid_id)
+        raid = get_raid_snapshot(session, raid_id)
 
-        if raid is None:
-            return
+    if raid is None:
+        return
 
-        channel_id = raid.channel_id
-        components = build_raid_ping(
-            raid.guild_id,
-            raid.channel_id,
-            raid.message_id,
-            raid.when,
-            raid.title,
-            raid.host_discord_id,
-            raid.users,
-            raid.host_username,
-            raid.host_uid,
-        )
-        user_mentions = [raid.host_discord_id] + [
-            user.discord_id for user in raid.users
-        ]
-    try:
-        await plugin.client.rest.create_message(
-            channel=channel_id,
-            components=components,
-            user_mentions=user_mentions,
-        )
-    except (ForbiddenError, NotFoundError):
-        with db().sm.begin() as session:
-            delete_raid_by_message_id(
-                raid_scheduler, session, raid.guild_id, raid.message_id
+    chunks = build_raid_ping(
+        raid.guild_id,
+        raid.channel_id,
+        raid.message_id,
+        raid.when,
+        raid.title,
+        raid.host_discord_id,
+        raid.users,
+        raid.host_username,
+        raid.host_uid,
+        reminder_lead(raid.when, int(time.time())),
+    )
+    allowed = set(raid.user_mentions())
+    # a ping resumed from a handoff skips the chunks the last process sent
+    sent = ping_progress.setdefault(raid_id, set())
+    unsent = [
+        (index, components, mentions)
+        for index, (components, mentions) in enumerate(chunks)
+        if index not in sent
+    ]
+
+    async def send(index: int, components: Components, mentions: list[int]) -> None:
+        async with rest_budget().slot(Priority.PING, raid.channel_id):
+            await plugin.client.rest.create_message(
+                channel=raid.channel_id,
+                components=components,
+                user_mentions=[m for m in mentions if m in allowed],
             )
+        sent.add(index)
+
+    # chunks go out one at a time, in order, through the channel's budget;
+    # a chunk that failed transiently is retried before the next one is sent
+    raid_config = raid_cfg()
+    given_up = 0
+    try:
+        for chunk in unsent:
+            for attempt in range(raid_config.raid_ping_retries + 1):
+                if attempt:
+                    await asyncio.sleep(raid_config.raid_ping_retry_delay * attempt)
+                try:
+                    await send(*chunk)
+                except Exception as e:
+                    if isinstance(e, (ForbiddenError, NotFoundError)):
+                        with db().sm.begin() as session:
+                            delete_raid_by_message_id(
+                                raid_scheduler(),
+                                session,
+                                raid.guild_id,
+                                raid.message_id,
+                            )
+                        return
+                    if is_transient(e):
+                        continue
+                    logger.warning("Failed to send ping for raid %d: %s", raid_id, e)
+                break
+            else:
+                given_up += 1
+        if given_up:
+            logger.warning("Gave up on %d ping chunks for raid %d", given_up, raid_id)
+    finally:
+        task = asyncio.current_task()
+        if task is None or not task.cancelling():
+            ping_progress.pop(raid_id, None)
+
+
+@traced("job sweep_reminders")
+async def sweep_reminders() -> None:
+    # due reminders wait in the database until there is room, so a backlog
+    # never grows the ping queue and its tasks past the cap
+    room = raid_cfg().raid_ping_queue_size - raid_queue().qsize() - len(ping_tasks)
+    if room <= 0:
         return
-    except InternalServerError:
-        return
+    now = int(datetime.now(UTC).timestamp())
+    with query_scope("raid.sweep_reminders", 3), db().sm.begin() as session:
+        due = take_due_reminders(session, now, room)
+    for raid_id in due:
+        await put_raid(raid_id)
+
+
+@traced("job compact_rosters")
+async def compact_rosters() -> None:
+    raid_config = raid_cfg()
+    with query_scope("raid.compact_rosters"), db().sm.begin() as session:
+        compacted = compact_roster_snapshots(
+            session,
+            raid_config.raid_snapshot_min_events,
+            raid_config.raid_snapshot_batch_size,
+        )
+    if compacted:
+        logger.info("compacted %d roster snapshots", compacted)
+
+
+@traced("job backfill_stats")
+async def backfill_stats() -> None:
+    with query_scope("raid.backfill_stats"), db().sm.begin() as session:
+        done = backfill_attendance(session, raid_cfg().raid_stats_backfill_batch_size)
+    if done:
+        logger.info("attendance statistics backfilled")
+        raid_scheduler().remove_job(ATTENDANCE_BACKFILL_JOB)
+
+
+@traced("job reconcile_raid_jobs")
+async def reconcile_raid_jobs() -> None:
+    now = int(datetime.now(UTC).timestamp())
+    with query_scope("raid.reconcile_jobs", 4), db().sm.begin() as session:
+        result = reconcile_jobs(raid_scheduler(), raid_jobstore(), session, now)
+    remove_stale_jobs(raid_scheduler(), result.stale_jobs)
+    logger.info(
+        "reconciled jobs: %d orphans removed, %d legacy jobs converted, "
+        "%d reminders and %d series jobs recreated",
+        result.orphan_jobs,
+        result.legacy_jobs,
+        result.missing_reminders,
+        result.missing_series_jobs,
+    )
+
+
+@traced("job backup_databases")
+async def backup_databases() -> None:
+    config = cfg().backup
+    stats = await asyncio.to_thread(
+        create_backup,
+        configured_databases(),
+        Path(config.path),
+        config.keep,
+        config.pages,
+        config.pause,
+        config.max_restarts,
+    )
+    for s in stats:
+        logger.info(
+            "backed up %s: %d pages in %.2f s, lock held %.2f ms "
+            "(max %.2f ms) over %d steps, %d restarts",
+            s.name,
+            s.pages,
+            s.duration,
+            s.lock_held * 1000,
+            s.max_lock_held * 1000,
+            s.steps,
+            s.restarts,
+        )
 
 
 async def raid_ping_loop() -> None:
+    limit = raid_cfg().raid_ping_queue_size
     while True:
-        raid_id = await raid_queue.get()
-        plugin.client.create_task(raid_ping(raid_id))
+        raid_id = await raid_queue().get()
+        # running pings are capped like the queue, so a burst waits in the
+        # queue instead of piling up as tasks
+        while len(ping_tasks) >= limit:
+            await asyncio.wait(ping_tasks, return_when=asyncio.FIRST_COMPLETED)
+        spawn(ping_tasks, raid_ping(raid_id), raid_id)
 
 
 @plugin.listen()
 async def _(_: StartedEvent) -> None:
-    await cleanup_deleted_raids()
+    profile = startup_profile()
+
+    with profile.measure("load state handoff"):
+        handoff = take_handoff(
+            raid_cfg().raid_state_path, raid_cfg().raid_state_max_age
+        )
 
-    raid_scheduler.add_job(
+    # the first liveness sweep runs in the background instead of delaying
+    # reminders; max_instances keeps it from overlapping the next interval.
+    # after a handoff it keeps the previous process's schedule
+    next_sweep = datetime.now(UTC)
+    if handoff is not None and handoff.liveness_swept_at is not None:
+        next_sweep = max(
+            next_sweep,
+            datetime.fromtimestamp(
+                handoff.liveness_swept_at + raid_cfg().raid_cleanup_interval, UTC
+            ),
+        )
+    raid_scheduler().add_job(
         cleanup_deleted_raids,
         IntervalTrigger(seconds=raid_cfg().raid_cleanup_interval),
         jobstore="memory",
+        next_run_time=next_sweep,
+        max_instances=1,
+        coalesce=True,
     )
 
-    raid_scheduler.start()
+    raid_scheduler().add_job(
+        reconcile_raid_jobs,
+        IntervalTrigger(seconds=raid_cfg().raid_reconcile_interval),
+        jobstore="memory",
+        next_run_time=datetime.now(UTC),
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # one sweep fires every due reminder instead of one job per reminder
+    raid_scheduler().add_job(
+        sweep_reminders,
+        IntervalTrigger(seconds=raid_cfg().raid_reminder_interval),
+        jobstore="memory",
+        next_run_time=datetime.now(UTC),
+        max_instances=1,
+        coalesce=True,
+    )
+
+    raid_scheduler().add_job(
+        compact_rosters,
+        IntervalTrigger(seconds=raid_cfg().raid_snapshot_interval),
+        jobstore="memory",
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # the backfill job removes itself once every old raid has been counted
+    raid_scheduler().add_job(
+        backfill_stats,
+        IntervalTrigger(seconds=raid_cfg().raid_stats_backfill_interval),
+        id=ATTENDANCE_BACKFILL_JOB,
+        jobstore="memory",
+        next_run_time=datetime.now(UTC),
+        max_instances=1,
+        coalesce=True,
+    )
+
+    if cfg().backup.interval:
+        raid_scheduler().add_job(
+            backup_databases,
+            IntervalTrigger(seconds=cfg().backup.interval),
+            jobstore="memory",
+            max_instances=1,
+            coalesce=True,
+        )
+
+    raid_scheduler().add_job(
+        reload_raid_templates_if_changed,
+        IntervalTrigger(seconds=raid_cfg().raid_config_reload_interval),
+        jobstore="memory",
+        next_run_time=datetime.now(UTC),
+    )
 
-    plugin.client.create_task(raid_ping_loop())
+    raid_scheduler().start()
+
+    intake_tasks.append(plugin.client.create_task(raid_ping_loop()))
+    intake_tasks.append(plugin.client.create_task(series_loop()))
+    worker_tasks.append(plugin.client.create_task(dm_dispatcher().run()))
+
+    if handoff is not None:
+        await restore_handoff(handoff)
+
+    with (
+        profile.measure("rebuild roster cache"),
+        query_scope("raid.rebuild_roster_cache", 5),
+        db().sm.begin() as session,
+    ):
+        if handoff is not None and handoff.watermark == state_watermark(session):
+            for roster in handoff.rosters:
+                cache_roster(roster)
+            warmed = len(roster_cache)
+        else:
+            warmed = rebuild_roster_cache(session, raid_cfg().raid_roster_cache_size)
+
+    logger.info("ready in %.3f s with %d raids", profile.elapsed(), warmed)
+    profile.report("ready")
+
+
+async def restore_handoff(handoff: Handoff) -> None:
+    # the queue loops are running, so this only waits if the handoff holds
+    # more work than the queues and running tasks together
+    for raid_id in handoff.pending_raids:
+        await put_raid(raid_id)
+    for series_id in handoff.pending_series:
+        await put_series(series_id)
+    for raid_id, indexes in handoff.ping_sent.items():
+        ping_progress[raid_id] = set(indexes)
+
+    for message_id, digest in handoff.fingerprints.items():
+        remember_fingerprint(message_id, digest)
+
+    dispatcher = dm_dispatcher()
+    dispatcher.channels.update(handoff.dm_channels)
+    # blocks are stored as wall clock times and mapped back onto this
+    # process's monotonic clock
+    offset = time.monotonic() - time.time()
+    for user_id, blocked_until in handoff.dm_blocked.items():
+        dispatcher.blocked[user_id] = blocked_until + offset
+
+    logger.info(
+        "resumed %d pings and %d series from the state handoff",
+        len(handoff.pending_raids),
+        len(handoff.pending_series),
+    )
+
+
+@plugin.listen()
+async def _(_: StoppingEvent) -> None:
+    raid_config = raid_cfg()
+    started = time.monotonic()
+
+    # stop intake: no jobs fire and the loops stop taking from the queues;
+    # whatever is already queued is started so that it drains with the rest
+    if raid_scheduler().running:
+        raid_scheduler().shutdown(wait=False)
+    for task in intake_tasks:
+        task.cancel()
+    while not raid_queue().empty():
+        raid_id = raid_queue().get_nowait()
+        spawn(ping_tasks, raid_ping(raid_id), raid_id)
+    while not series_queue().empty():
+        series_id = series_queue().get_nowait()
+        spawn(series_tasks, open_series_raid(series_id), series_id)
+
+    dispatcher = dm_dispatcher()
+    dms = plugin.client.create_task(dispatcher.queue.join())
+    done, pending = await asyncio.wait(
+        [*ping_tasks, *series_tasks, dms], timeout=raid_config.raid_drain_timeout
+    )
+    # the next process sends only the chunks of a cancelled ping that did
+    # not go out yet
+    pending_raids = [id for task, id in ping_tasks.items() if task in pending]
+    ping_sent = {
+        raid_id: sorted(ping_progress[raid_id])
+        for raid_id in pending_raids
+        if ping_progress.get(raid_id)
+    }
+    pending_series = [id for task, id in series_tasks.items() if task in pending]
+    dropped_dms = dispatcher.queue.qsize()
+    for task in pending:
+        task.cancel()
+    for task in worker_tasks:
+        task.cancel()
+
+    now = time.time()
+    offset = now - time.monotonic()
+    with query_scope("raid.handoff", 1), db().sm.begin() as session:
+        watermark = state_watermark(session)
+    save_handoff(
+        raid_config.raid_state_path,
+        Handoff(
+            saved_at=now,
+            watermark=watermark,
+            pending_raids=pending_raids,
+            ping_sent=ping_sent,
+            pending_series=pending_series,
+            rosters=list(roster_cache.values()),
+            dm_channels=dict(dispatcher.channels),
+            dm_blocked={
+                user_id: blocked_until + offset
+                for user_id, blocked_until in dispatcher.blocked.items()
+                if blocked_until + offset > now
+            },
+            liveness_swept_at=liveness_swept_at,
+            fingerprints=dict(fingerprints),
+        ),
+    )
+
+    logger.info(
+        "drained in %.3f s; handed off %d pings, %d series and %d rosters, "
+        "dropped %d DMs",
+        time.monotonic() - started,
+        len(pending_raids),
+        len(pending_series),
+        len(roster_cache),
+        dropped_dms,
+    )
+    logger.info(
+        "DMs: %s", ", ".join(f"{v} {k}" for k, v in dispatcher.metrics().items())
+    )
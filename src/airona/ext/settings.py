@@ -1,10 +1,34 @@
+import asyncio
+import logging
+import time
+
 import arc
-from arc import AutodeferMode, GatewayContext, GatewayPlugin
-from hikari import MessageFlag, Permissions
+from arc import AutodeferMode, GatewayContext, GatewayPlugin, Option, StrParams
+from hikari import MessageFlag, NotFoundError, Permissions
 
-from airona.db import model
 from airona.db.connection import db
+from airona.db.profile import query_scope
+from airona.env import raid_cfg
 from airona.etc import error_handler
+from airona.ext.raid import raid_scheduler
+from airona.lib.purge import (
+    count_guild_raids,
+    purge_guild,
+    purge_guild_raids,
+    purge_guild_series,
+)
+from airona.lib.roster import invalidate_guild_rosters, invalidate_roster
+from airona.lib.template import (
+    EMOJI_FIELDS,
+    TEMPLATE_FIELDS,
+    custom_emoji_id,
+    delete_guild_template,
+    get_guild_template,
+    invalidate_guild_templates,
+    set_guild_template,
+)
+
+logger = logging.getLogger(__name__)
 
 plugin = GatewayPlugin(__name__)
 
@@ -17,17 +41,178 @@ settings_group = plugin.include_slash_group(
 settings_group.add_hook(arc.guild_only)
 settings_group.set_error_handler(error_handler.guild_only)
 
+purges: dict[int, asyncio.Task[None]] = {}
+
 
 @settings_group.include
 @arc.slash_subcommand("reset", "Reset all settings to default.")
 async def _(ctx: GatewayContext) -> None:
     if ctx.guild_id is None:
         return
+    guild_id = int(ctx.guild_id)
+    if guild_id in purges:
+        await ctx.respond(
+            "\N{CROSS MARK} A reset is already in progress.",
+            flags=MessageFlag.EPHEMERAL,
+        )
+        return
+
     with db().sm.begin() as session:
-        guild = session.get(model.Guild, ctx.guild_id)
-        if guild is not None:
-            session.delete(guild)
+        # series go first so that no new raid is opened during the purge
+        purge_guild_series(raid_scheduler(), session, guild_id)
+        total = count_guild_raids(session, guild_id)
+    await ctx.respond(
+        f"\N{HOURGLASS WITH FLOWING SAND} Deleting {total} raids...",
+        flags=MessageFlag.EPHEMERAL,
+    )
+    purges[guild_id] = plugin.client.create_task(reset_guild(ctx, guild_id, total))
+    purges[guild_id].add_done_callback(lambda _: purges.pop(guild_id, None))
+
+
+async def reset_guild(ctx: GatewayContext, guild_id: int, total: int) -> None:
+    raid_config = raid_cfg()
+
+    def purge_chunk() -> list[int]:
+        with query_scope("settings.purge_chunk"), db().sm.begin() as session:
+            return purge_guild_raids(
+                raid_scheduler(), session, guild_id, raid_config.raid_purge_chunk_size
+            )
+
+    deleted = 0
+    reported = time.monotonic()
+    try:
+        # short transactions on a worker thread, with a pause in between, keep
+        # the write lock available to every other guild
+        while raid_ids := await asyncio.to_thread(purge_chunk):
+            # the caches are only touched from the event loop
+            for raid_id in raid_ids:
+                invalidate_roster(raid_id)
+            deleted += len(raid_ids)
+            if time.monotonic() - reported >= raid_config.raid_purge_progress_interval:
+                reported = time.monotonic()
+                await report(
+                    ctx,
+                    f"\N{HOURGLASS WITH FLOWING SAND} Deleted {deleted}/{total} raids...",
+                )
+            await asyncio.sleep(raid_config.raid_purge_pause)
+        with db().sm.begin() as session:
+            purge_guild(session, guild_id)
+    except Exception:
+        logger.exception("Failed to reset guild %d", guild_id)
+        await report(ctx, f"\N{CROSS MARK} Reset failed after {deleted} raids.")
+        return
+    finally:
+        invalidate_guild_rosters(guild_id)
+        invalidate_guild_templates(guild_id)
+    await report(
+        ctx, "\N{WHITE HEAVY CHECK MARK} All settings have been reset to default."
+    )
+
+
+async def report(ctx: GatewayContext, content: str) -> None:
+    # the interaction token expires after 15 minutes; the purge continues
+    try:
+        await ctx.edit_initial_response(content)
+    except Exception as e:
+        logger.debug("Failed to report reset progress: %s", e)
+
+
+template_group = settings_group.include_subgroup(
+    "template", "Customize the raid messages of this server."
+)
+
+TEMPLATE_CHOICES = {name.removesuffix("_template"): name for name in TEMPLATE_FIELDS}
+EMOJI_CHOICES = {name: f"{name}_emoji" for name in EMOJI_FIELDS}
+
+
+async def update_guild_template(
+    ctx: GatewayContext, field: str, value: str | None
+) -> None:
+    if ctx.guild_id is None:
+        return
+    emoji_id = custom_emoji_id(value) if value is not None else None
+    if field.endswith("_emoji") and emoji_id is not None:
+        try:
+            await plugin.client.rest.fetch_emoji(ctx.guild_id, emoji_id)
+        except NotFoundError:
+            await ctx.respond(
+                f"\N{CROSS MARK} {value} is not an emoji of this server.",
+                flags=MessageFlag.EPHEMERAL,
+            )
+            return
+    # the transaction rolls back when the new template does not compile
+    try:
+        with query_scope("settings.template", 3), db().sm.begin() as session:
+            set_guild_template(session, ctx.guild_id, field, value)
+    except ValueError as e:
+        await ctx.respond(f"\N{CROSS MARK} {e}", flags=MessageFlag.EPHEMERAL)
+        return
+    invalidate_guild_templates(ctx.guild_id)
+    await ctx.respond("\N{WHITE HEAVY CHECK MARK}", flags=MessageFlag.EPHEMERAL)
+
+
+@template_group.include
+@arc.slash_subcommand("set", "Set a message template.")
+async def _(
+    ctx: GatewayContext,
+    name: Option[str, StrParams("the template to set.", choices=TEMPLATE_CHOICES)],
+    template: Option[
+        str,
+        StrParams(
+            "the template, with the fields of raid.toml. write \\n for a newline."
+        ),
+    ],
+) -> None:
+    await update_guild_template(ctx, name, template.replace("\\n", "\n"))
+
+
+@template_group.include
+@arc.slash_subcommand("emoji", "Set a button emoji.")
+async def _(
+    ctx: GatewayContext,
+    name: Option[str, StrParams("the emoji to set.", choices=EMOJI_CHOICES)],
+    emoji: Option[str, StrParams("the emoji.")],
+) -> None:
+    await update_guild_template(ctx, name, emoji)
+
+
+@template_group.include
+@arc.slash_subcommand("reset", "Reset a template or emoji to the default.")
+async def _(
+    ctx: GatewayContext,
+    name: Option[
+        str | None,
+        StrParams(
+            "the template or emoji to reset; resets everything if omitted.",
+            choices=TEMPLATE_CHOICES | EMOJI_CHOICES,
+        ),
+    ] = None,
+) -> None:
+    if ctx.guild_id is None:
+        return
+    if name is not None:
+        await update_guild_template(ctx, name, None)
+        return
+    with query_scope("settings.template", 1), db().sm.begin() as session:
+        delete_guild_template(session, ctx.guild_id)
+    invalidate_guild_templates(ctx.guild_id)
+    await ctx.respond("\N{WHITE HEAVY CHECK MARK}", flags=MessageFlag.EPHEMERAL)
+
+
+@template_group.include
+@arc.slash_subcommand("show", "Show the customized templates and emojis.")
+async def _(ctx: GatewayContext) -> None:
+    if ctx.guild_id is None:
+        return
+    with query_scope("settings.template", 1), db().sm.begin() as session:
+        guild_template = get_guild_template(session, ctx.guild_id)
+        fields = [
+            (name, getattr(guild_template, field))
+            for name, field in (TEMPLATE_CHOICES | EMOJI_CHOICES).items()
+            if guild_template is not None
+        ]
+    lines = [f"**{name}**\n```\n{value}\n```" for name, value in fields if value]
     await ctx.respond(
-        "\N{WHITE HEAVY CHECK MARK} All settings have been reset to default.",
+        "\n".join(lines)[:2000] if lines else "All templates are the defaults.",
         flags=MessageFlag.EPHEMERAL,
     )
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+from asyncio import QueueFull
+from collections import OrderedDict
+
+from hikari import ForbiddenError, HTTPError, NotFoundError, Snowflakeish
+from hikari.api import RESTClient
+
+from airona.lib.rest import Priority, RestBudget
+from airona.typing import Components
+
+logger = logging.getLogger(__name__)
+
+
+class DmDispatcher:
+    def __init__(
+        self,
+        rest: RESTClient,
+        budget: RestBudget,
+        concurrency: int,
+        queue_size: int,
+        channel_cache_size: int,
+        blocked_ttl: float,
+        blocked_size: int,
+    ) -> None:
+        self.rest = rest
+        self.budget = budget
+        self.concurrency = concurrency
+        self.channel_cache_size = channel_cache_size
+        self.blocked_ttl = blocked_ttl
+        self.blocked_size = blocked_size
+
+        self.queue: asyncio.Queue[tuple[int, Components]] = asyncio.Queue(queue_size)
+        self.channels: OrderedDict[int, int] = OrderedDict()
+        self.blocked: dict[int, float] = {}
+
+        self.delivered = 0
+        self.failed = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def send(self, user_id: Snowflakeish, components: Components) -> None:
+        try:
+            self.queue.put_nowait((int(user_id), components))
+        except QueueFull:
+            self.dropped += 1
+            logger.warning("DM queue is full, dropping DM to %s", user_id)
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self.worker() for _ in range(self.concurrency)))
+
+    async def worker(self) -> None:
+        while True:
+            user_id, components = await self.queue.get()
+            try:
+                await self.deliver(user_id, components)
+            except HTTPError as e:
+                self.failed += 1
+                logger.warning("Failed to send DM to %s: %s", user_id, e)
+            except Exception:
+                # a bug rather than a delivery failure; the worker keeps going
+                self.errors += 1
+                logger.exception("Unexpected error sending DM to %s", user_id)
+            finally:
+                self.queue.task_done()
+
+    async def deliver(self, user_id: int, components: Components) -> None:
+        now = time.monotonic()
+        blocked_until = self.blocked.get(user_id)
+        if blocked_until is not None:
+            if blocked_until > now:
+                self.skipped += 1
+                return
+            del self.blocked[user_id]
+
+        channel_id = await self.channel_id(user_id)
+        try:
+            async with self.budget.slot(Priority.DM, channel_id):
+                await self.rest.create_message(channel_id, components=components)
+        except ForbiddenError:
+            # the user has DMs closed or shares no guild with the bot
+            self.block(user_id, now)
+            self.failed += 1
+            return
+        except NotFoundError:
+            self.channels.pop(user_id, None)
+            raise
+        self.delivered += 1
+
+    def block(self, user_id: int, now: float) -> None:
+        self.blocked.pop(user_id, None)
+        self.blocked[user_id] = now + self.blocked_ttl
+        # every block has the same ttl, so insertion order is expiry order
+        while self.blocked and (
+            len(self.blocked) > self.blocked_size
+            or next(iter(self.blocked.values())) <= now
+        ):
+            del self.blocked[next(iter(self.blocked))]
+
+    async def channel_id(self, user_id: int) -> int:
+        channel_id = self.channels.get(user_id)
+        if channel_id is not None:
+            self.channels.move_to_end(user_id)
+            return channel_id
+        async with self.budget.slot(Priority.DM, "create_dm_channel"):
+            channel = await self.rest.create_dm_channel(user_id)
+        self.channels[user_id] = channel_id = int(channel.id)
+        while len(self.channels) > self.channel_cache_size:
+            self.channels.popitem(last=False)
+        return channel_id
+
+    def metrics(self) -> dict[str, int]:
+        return {
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "pending": self.queue.qsize(),
+        }
@@ -0,0 +1,237 @@
+import time
+from collections.abc import Iterable
+from dataclasses import replace
+from enum import StrEnum
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from airona.db import model
+from airona.lib.roster import (
+    RaidUserSnapshot,
+    Role,
+    cache_roster,
+    roster_cache,
+    snapshot_raid,
+)
+
+
+class EventKind(StrEnum):
+    JOIN = "join"
+    LEAVE = "leave"
+    ROLE = "role"
+    CLEARED = "cleared"
+
+
+def event_row(
+    raid_id: int,
+    discord_id: int,
+    kind: EventKind,
+    role: str | None = None,
+    has_cleared: bool | None = None,
+) -> dict:
+    return {
+        "raid_id": raid_id,
+        "discord_id": discord_id,
+        "kind": kind,
+        "role": role,
+        "has_cleared": has_cleared,
+        "at": int(time.time()),
+    }
+
+
+def record_event(
+    session: Session,
+    raid_id: int,
+    discord_id: int,
+    kind: EventKind,
+    role: str | None = None,
+    has_cleared: bool | None = None,
+) -> None:
+    session.add(
+        model.RaidEvent(**event_row(raid_id, discord_id, kind, role, has_cleared))
+    )
+
+
+def record_events(session: Session, rows: list[dict]) -> None:
+    # bulk commands write all their events in one executemany insert; nulls
+    # are rendered so rows of every kind share one parameter set
+    if rows:
+        session.execute(
+            insert(model.RaidEvent).execution_options(render_nulls=True), rows
+        )
+
+
+def replay(
+    users: Iterable[RaidUserSnapshot],
+    events: Iterable[model.RaidEvent],
+) -> tuple[RaidUserSnapshot, ...]:
+    # dicts keep insertion order, which is the sign-up order
+    roster = {user.discord_id: user for user in users}
+    for event in events:
+        user = roster.get(event.discord_id)
+        match event.kind:
+            case EventKind.JOIN:
+                roster[event.discord_id] = RaidUserSnapshot(
+                    event.discord_id, Role(event.role), bool(event.has_cleared)
+                )
+            case EventKind.LEAVE:
+                roster.pop(event.discord_id, None)
+            case EventKind.ROLE if user is not None:
+                roster[event.discord_id] = RaidUserSnapshot(
+                    user.discord_id, Role(event.role), user.has_cleared
+                )
+            case EventKind.CLEARED if user is not None:
+                roster[event.discord_id] = RaidUserSnapshot(
+                    user.discord_id, user.role, bool(event.has_cleared)
+                )
+    return tuple(roster.values())
+
+
+def load_snapshot_users(
+    snapshot: model.RaidRosterSnapshot,
+) -> tuple[RaidUserSnapshot, ...]:
+    return tuple(
+        RaidUserSnapshot(int(discord_id), Role(role), bool(has_cleared))
+        for discord_id, role, has_cleared in snapshot.users
+    )
+
+
+def dump_snapshot_users(users: Iterable[RaidUserSnapshot]) -> list[list]:
+    return [[user.discord_id, user.role, user.has_cleared] for user in users]
+
+
+def create_roster_snapshot(session: Session, raid_id: int) -> None:
+    session.add(model.RaidRosterSnapshot(raid_id=raid_id, event_id=0, users=[]))
+
+
+def rebuild_roster_cache(session: Session, limit: int) -> int:
+    # rosters are rebuilt from each raid's latest snapshot plus the events
+    # logged after it; raids that predate the log fall back to raid_user.
+    # only the latest raids are loaded, the rest are cached on first use
+    raid_ids = select(model.Raid.id).order_by(model.Raid.when.desc()).limit(limit)
+    raids = {
+        raid.id: raid
+        for raid in session.scalars(
+            select(model.Raid)
+            .where(model.Raid.id.in_(raid_ids))
+            .order_by(model.Raid.when)
+        )
+    }
+    snapshots = {
+        snapshot.raid_id: snapshot
+        for snapshot in session.scalars(
+            select(model.RaidRosterSnapshot).where(
+                model.RaidRosterSnapshot.raid_id.in_(raid_ids)
+            )
+        )
+    }
+    tails: dict[int, list[model.RaidEvent]] = {}
+    for event in session.scalars(
+        select(model.RaidEvent)
+        .join(
+            model.RaidRosterSnapshot,
+            model.RaidRosterSnapshot.raid_id == model.RaidEvent.raid_id,
+        )
+        .where(
+            model.RaidEvent.raid_id.in_(raid_ids),
+            model.RaidEvent.id > model.RaidRosterSnapshot.event_id,
+        )
+        .order_by(model.RaidEvent.id)
+    ):
+        tails.setdefault(event.raid_id, []).append(event)
+    legacy: dict[int, list[model.RaidUser]] = {
+        raid_id: [] for raid_id in raids if raid_id not in snapshots
+    }
+    if legacy:
+        for user in session.scalars(
+            select(model.RaidUser)
+            .where(model.RaidUser.raid_id.in_(legacy))
+            .order_by(model.RaidUser.id)
+        ):
+            legacy[user.raid_id].append(user)
+
+    roster_cache.clear()
+    for raid_id, raid in raids.items():
+        snapshot = snapshots.get(raid_id)
+        if snapshot is None:
+            cache_roster(snapshot_raid(raid, legacy[raid_id]))
+            continue
+        users = replay(load_snapshot_users(snapshot), tails.get(raid_id, []))
+        cache_roster(replace(snapshot_raid(raid, []), users=users))
+    return len(roster_cache)
+
+
+def compact_roster_snapshots(session: Session, min_events: int, limit: int) -> int:
+    # folds the tail of every raid with at least min_events new events into its
+    # snapshot, and seeds snapshots for raids that predate the log
+    compacted = 0
+    for raid_id in session.scalars(
+        select(model.Raid.id)
+        .outerjoin(
+            model.RaidRosterSnapshot,
+            model.RaidRosterSnapshot.raid_id == model.Raid.id,
+        )
+        .where(model.RaidRosterSnapshot.raid_id.is_(None))
+        .limit(limit)
+    ):
+        users = session.scalars(
+            select(model.RaidUser)
+            .where(model.RaidUser.raid_id == raid_id)
+            .order_by(model.RaidUser.id)
+        )
+        event_id = session.scalar(
+            select(func.coalesce(func.max(model.RaidEvent.id), 0)).where(
+                model.RaidEvent.raid_id == raid_id
+            )
+        )
+        session.add(
+            model.RaidRosterSnapshot(
+                raid_id=raid_id,
+                event_id=event_id,
+                users=[[u.discord_id, u.role, bool(u.has_cleared)] for u in users],
+            )
+        )
+        compacted += 1
+
+    for snapshot in session.scalars(
+        select(model.RaidRosterSnapshot)
+        .join(
+            model.RaidEvent,
+            model.RaidEvent.raid_id == model.RaidRosterSnapshot.raid_id,
+        )
+        .where(model.RaidEvent.id > model.RaidRosterSnapshot.event_id)
+        .group_by(model.RaidRosterSnapshot.raid_id)
+        .having(func.count(model.RaidEvent.id) >= min_events)
+        .limit(max(limit - compacted, 0))
+    ):
+        tail = list(
+            session.scalars(
+                select(model.RaidEvent)
+                .where(
+                    (model.RaidEvent.raid_id == snapshot.raid_id)
+                    & (model.RaidEvent.id > snapshot.event_id)
+                )
+                .order_by(model.RaidEvent.id)
+            )
+        )
+        snapshot.users = dump_snapshot_users(
+            replay(load_snapshot_users(snapshot), tail)
+        )
+        snapshot.event_id = tail[-1].id
+        compacted += 1
+    session.flush()
+    return compacted
+
+
+def raid_history(
+    session: Session,
+    raid_id: int,
+    before: int | None,
+    limit: int,
+) -> list[model.RaidEvent]:
+    # served by ix_raid_event_raid_id_id, newest first
+    query = select(model.RaidEvent).where(model.RaidEvent.raid_id == raid_id)
+    if before is not None:
+        query = query.where(model.RaidEvent.id < before)
+    return list(session.scalars(query.order_by(model.RaidEvent.id.desc()).limit(limit)))
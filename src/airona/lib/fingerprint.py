@@ -0,0 +1,38 @@
+import hashlib
+import json
+from collections import OrderedDict
+from collections.abc import Iterable
+
+from hikari import Snowflakeish
+
+from airona.env import raid_cfg
+from airona.typing import Components
+
+# the fingerprint of what each raid message currently shows, by message id
+fingerprints: OrderedDict[int, str] = OrderedDict()
+
+
+def fingerprint(components: Components, mentions: Iterable[Snowflakeish]) -> str:
+    payload = [component.build()[0] for component in components]
+    data = json.dumps(
+        [payload, sorted(int(m) for m in mentions)], sort_keys=True, default=str
+    )
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+def is_unchanged(message_id: Snowflakeish, digest: str) -> bool:
+    if fingerprints.get(int(message_id)) != digest:
+        return False
+    fingerprints.move_to_end(int(message_id))
+    return True
+
+
+def remember_fingerprint(message_id: Snowflakeish, digest: str) -> None:
+    fingerprints[int(message_id)] = digest
+    fingerprints.move_to_end(int(message_id))
+    while len(fingerprints) > raid_cfg().raid_fingerprint_cache_size:
+        fingerprints.popitem(last=False)
+
+
+def forget_fingerprint(message_id: Snowflakeish) -> None:
+    fingerprints.pop(int(message_id), None)
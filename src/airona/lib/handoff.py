@@ -0,0 +1,63 @@
+import logging
+import time
+from pathlib import Path
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from airona.db import model
+from airona.lib.roster import RaidSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+class Handoff(BaseModel):
+    saved_at: float
+    watermark: tuple[int, int, int]
+    pending_raids: list[int] = []
+    ping_sent: dict[int, list[int]] = {}
+    pending_series: list[int] = []
+    rosters: list[RaidSnapshot] = []
+    dm_channels: dict[int, int] = {}
+    dm_blocked: dict[int, float] = {}
+    liveness_swept_at: float | None = None
+    fingerprints: dict[int, str] = {}
+
+
+def state_watermark(session: Session) -> tuple[int, int, int]:
+    # every roster change records an event and every raid insert or delete
+    # moves the raid id or count, so an unchanged watermark means the cached
+    # rosters are still exact
+    last_event_id = select(func.max(model.RaidEvent.id)).scalar_subquery()
+    row = session.execute(
+        select(last_event_id, func.max(model.Raid.id), func.count(model.Raid.id))
+    ).one()
+    return int(row[0] or 0), int(row[1] or 0), int(row[2])
+
+
+def save_handoff(path: str, handoff: Handoff) -> None:
+    target = Path(path)
+    partial = target.with_suffix(".partial")
+    partial.write_text(handoff.model_dump_json())
+    partial.replace(target)
+
+
+def take_handoff(path: str, max_age: float) -> Handoff | None:
+    # the file is consumed on load, so a crash later falls back to a full
+    # rebuild instead of resuming from an outdated handoff
+    target = Path(path)
+    try:
+        data = target.read_bytes()
+    except FileNotFoundError:
+        return None
+    target.unlink()
+    try:
+        handoff = Handoff.model_validate_json(data)
+    except ValidationError as e:
+        logger.warning("ignoring unreadable state handoff: %s", e)
+        return None
+    if time.time() - handoff.saved_at > max_age:
+        logger.info("ignoring state handoff older than %d s", max_age)
+        return None
+    return handoff
@@ -0,0 +1,140 @@
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+
+from hikari import Snowflakeish
+from sqlalchemy import ColumnElement, String, cast, literal, select, tuple_
+from sqlalchemy.orm import Session
+
+from airona.db import model
+
+
+@dataclass(frozen=True, slots=True)
+class RaidListing:
+    id: int
+    channel_id: int
+    message_id: int
+    when: int
+    title: str
+
+    @property
+    def cursor(self) -> tuple[int, int]:
+        return self.when, self.id
+
+
+@dataclass(frozen=True, slots=True)
+class RaidPage:
+    raids: tuple[RaidListing, ...]
+    has_more: bool
+
+
+listing_cache: OrderedDict[Hashable, tuple[float, RaidPage]] = OrderedDict()
+
+
+def invalidate_listings() -> None:
+    listing_cache.clear()
+
+
+def upcoming_raids(guild_id: Snowflakeish, now: int) -> ColumnElement[bool]:
+    # served by ix_raid_guild_id_when, in the order of UPCOMING_ORDER
+    return (model.Raid.guild_id == guild_id) & (model.Raid.when >= now)
+
+
+UPCOMING_ORDER = (model.Raid.when, model.Raid.id)
+
+
+def fetch_page(
+    session: Session,
+    key: Hashable,
+    criteria: ColumnElement[bool],
+    after: tuple[int, int] | None,
+    limit: int,
+    max_size: int,
+    ttl: float,
+) -> RaidPage:
+    now = time.monotonic()
+    cached = listing_cache.get(key)
+    if cached is not None and cached[0] > now:
+        listing_cache.move_to_end(key)
+        return cached[1]
+    query = select(model.Raid).where(criteria).order_by(*UPCOMING_ORDER)
+    if after is not None:
+        query = query.where(tuple_(*UPCOMING_ORDER) > tuple_(*map(literal, after)))
+    raids = [
+        RaidListing(
+            int(raid.id),
+            int(raid.channel_id),
+            int(raid.message_id),
+            int(raid.when),
+            raid.title,
+        )
+        for raid in session.scalars(query.limit(limit + 1))
+    ]
+    page = RaidPage(tuple(raids[:limit]), len(raids) > limit)
+    listing_cache[key] = (now + ttl, page)
+    while len(listing_cache) > max_size:
+        listing_cache.popitem(last=False)
+    return page
+
+
+def list_guild_raids(
+    session: Session,
+    guild_id: Snowflakeish,
+    now: int,
+    after: tuple[int, int] | None,
+    limit: int,
+    max_size: int,
+    ttl: float,
+) -> RaidPage:
+    return fetch_page(
+        session,
+        ("guild", int(guild_id), after),
+        upcoming_raids(guild_id, now),
+        after,
+        limit,
+        max_size,
+        ttl,
+    )
+
+
+def list_user_raids(
+    session: Session,
+    guild_id: Snowflakeish,
+    discord_id: Snowflakeish,
+    now: int,
+    after: tuple[int, int] | None,
+    limit: int,
+    max_size: int,
+    ttl: float,
+) -> RaidPage:
+    # ix_raid_user_discord_id narrows the roster rows before the join
+    criteria = upcoming_raids(guild_id, now) & model.Raid.id.in_(
+        select(model.RaidUser.raid_id).where(model.RaidUser.discord_id == discord_id)
+    )
+    return fetch_page(
+        session,
+        ("user", int(guild_id), int(discord_id), after),
+        criteria,
+        after,
+        limit,
+        max_size,
+        ttl,
+    )
+
+
+def search_raids(
+    session: Session,
+    guild_id: Snowflakeish,
+    now: int,
+    text: str,
+    limit: int,
+) -> list[model.Raid]:
+    criteria = upcoming_raids(guild_id, now)
+    if text:
+        criteria = criteria & (
+            cast(model.Raid.message_id, String).startswith(text, autoescape=True)
+            | model.Raid.title.icontains(text, autoescape=True)
+        )
+    query = select(model.Raid).where(criteria).order_by(*UPCOMING_ORDER)
+    return list(session.scalars(query.limit(limit)))
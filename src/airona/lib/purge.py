@@ -0,0 +1,82 @@
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from hikari import Snowflakeish
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from airona.db import model
+from airona.lib.series import series_job_id
+
+
+def purge_guild_series(
+    raid_scheduler: AsyncIOScheduler,
+    session: Session,
+    guild_id: Snowflakeish,
+) -> int:
+    series_ids = list(
+        session.scalars(
+            select(model.RaidSeries.id).where(model.RaidSeries.guild_id == guild_id)
+        )
+    )
+    for series_id in series_ids:
+        try:
+            raid_scheduler.remove_job(series_job_id(series_id))
+        except JobLookupError:
+            pass
+    session.execute(
+        delete(model.RaidSeries).where(model.RaidSeries.guild_id == guild_id)
+    )
+    return len(series_ids)
+
+
+def purge_guild_raids(
+    raid_scheduler: AsyncIOScheduler,
+    session: Session,
+    guild_id: Snowflakeish,
+    limit: int,
+) -> list[int]:
+    # deletes at most limit raids together with their rosters, so that each
+    # transaction holds the write lock only briefly. runs on a worker thread,
+    # so the caller invalidates the cached rosters of the returned raids
+    raid_ids = list(
+        session.scalars(
+            select(model.Raid.id).where(model.Raid.guild_id == guild_id).limit(limit)
+        )
+    )
+    if not raid_ids:
+        return raid_ids
+    for raid_id in raid_ids:
+        # raids from before the reminder sweep still have a job of their own
+        try:
+            raid_scheduler.remove_job(f"{raid_id}")
+        except JobLookupError:
+            pass
+    for table in (
+        model.RaidUser,
+        model.RaidEvent,
+        model.RaidRosterSnapshot,
+        model.RaidReminder,
+    ):
+        session.execute(delete(table).where(table.raid_id.in_(raid_ids)))
+    session.execute(
+        delete(model.Raid).where(model.Raid.id.in_(raid_ids)),
+        execution_options={"synchronize_session": False},
+    )
+    return raid_ids
+
+
+def purge_guild(session: Session, guild_id: Snowflakeish) -> None:
+    for table in (model.UserAttendance, model.RoleAttendance, model.GuildTemplate):
+        session.execute(delete(table).where(table.guild_id == guild_id))
+    session.execute(delete(model.Guild).where(model.Guild.id == guild_id))
+
+
+def count_guild_raids(session: Session, guild_id: Snowflakeish) -> int:
+    return (
+        session.scalar(
+            select(func.count())
+            .select_from(model.Raid)
+            .where(model.Raid.guild_id == guild_id)
+        )
+        or 0
+    )
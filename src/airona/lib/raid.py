@@ -1,19 +1,27 @@
+import functools
 from asyncio import Queue
 from datetime import UTC, datetime
 
 from apscheduler.jobstores.base import JobLookupError
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.date import DateTrigger
 from hikari import Snowflakeish
-from sqlalchemy import select
+from sqlalchemy import delete, insert, select
 from sqlalchemy.orm import Session
 
 from airona.db import model
 from airona.env import raid_cfg
+from airona.lib.events import (
+    EventKind,
+    create_roster_snapshot,
+    event_row,
+    record_event,
+    record_events,
+)
+from airona.lib.roster import invalidate_roster
+from airona.lib.stats import apply_attendance, attendance_changes
 
 
 def create_raid(
-    raid_scheduler: AsyncIOScheduler,
     session: Session,
     guild_id: Snowflakeish,
     channel_id: Snowflakeish,
@@ -24,11 +32,8 @@ def create_raid(
     when: int,
     title: str | None,
 ) -> model.Raid:
-    try:
-        dt = datetime.fromtimestamp(when, tz=UTC)
-        trigger = DateTrigger(run_date=dt)
-    except ValueError:
-        raise
+    # reject timestamps that cannot be represented before touching the db
+    datetime.fromtimestamp(when, tz=UTC)
     guild = session.get(model.Guild, guild_id) or model.Guild(id=guild_id)
     raid = model.Raid(
         guild_id=guild_id,
@@ -43,15 +48,11 @@ def create_raid(
     guild.raids.append(raid)
     session.add(guild)
     session.flush()
-    raid_scheduler.add_job(
-        id=f"{raid.id}",
-        replace_existing=True,
-        trigger=trigger,
-        coalesce=True,
-        misfire_grace_time=raid_cfg().raid_misfire_grace_time,
-        func=put_raid,
-        args=(raid.id,),
-    )
+    # also runs on worker threads, so callers invalidate the listings
+    create_roster_snapshot(session, raid.id)
+    next_at = next_reminder_at(when, int(datetime.now(UTC).timestamp()))
+    if next_at is not None:
+        session.add(model.RaidReminder(raid_id=raid.id, next_at=next_at))
     return raid
 
 
@@ -93,6 +94,7 @@ def delete_raid_by_message_id(
         raid_scheduler.remove_job(f"{raid.id}")
     except JobLookupError:
         pass
+    invalidate_roster(raid.id)
     session.delete(raid)
     return raid
 
@@ -108,7 +110,12 @@ def create_raid_user(
         raid_id=raid_id, discord_id=discord_id, role=role, has_cleared=has_cleared
     )
     session.add(user)
+    record_event(session, raid_id, discord_id, EventKind.JOIN, role, has_cleared)
+    if (changes := attendance_changes(session, raid_id)) is not None:
+        changes.join(discord_id, role, has_cleared)
+        apply_attendance(session, changes)
     session.flush()
+    invalidate_roster(raid_id)
     return user
 
 
@@ -136,11 +143,22 @@ def edit_raid_user(
     user = get_raid_user_by_discord_id(session, raid_id, discord_id)
     if user is None:
         raise IndexError(f"User not registered for raid {raid_id}")
-    if role is not None:
+    changes = attendance_changes(session, raid_id)
+    if role is not None and role != user.role:
+        if changes is not None:
+            changes.switch(user.role, role, user.has_cleared)
         user.role = role
-    if has_cleared is not None:
+        record_event(session, raid_id, discord_id, EventKind.ROLE, role=role)
+    if has_cleared is not None and has_cleared != user.has_cleared:
+        if changes is not None:
+            changes.clear(discord_id, user.role, has_cleared)
         user.has_cleared = has_cleared
+        record_event(
+            session, raid_id, discord_id, EventKind.CLEARED, has_cleared=has_cleared
+        )
+    apply_attendance(session, changes)
     session.add(user)
+    invalidate_roster(raid_id)
     return user
 
 
@@ -153,11 +171,221 @@ def delete_raid_user_by_discord_id(
     if user is None:
         raise IndexError(f"User not registered for raid {raid_id}")
     session.delete(user)
+    record_event(session, raid_id, discord_id, EventKind.LEAVE)
+    if (changes := attendance_changes(session, raid_id)) is not None:
+        changes.leave(discord_id, user.role, user.has_cleared)
+        apply_attendance(session, changes)
+    invalidate_roster(raid_id)
     return user
 
 
-raid_queue: Queue[int] = Queue()
+def set_raid_users(
+    session: Session,
+    raid_id: int,
+    discord_ids: list[int],
+    role: str,
+    has_cleared: bool,
+) -> None:
+    existing = {
+        user.discord_id: user
+        for user in session.scalars(
+            select(model.RaidUser).where(
+                (model.RaidUser.raid_id == raid_id)
+                & (model.RaidUser.discord_id.in_(discord_ids))
+            )
+        )
+    }
+    changes = attendance_changes(session, raid_id)
+    added: list[dict] = []
+    events: list[dict] = []
+    for discord_id in discord_ids:
+        user = existing.get(discord_id)
+        if user is None:
+            added.append(
+                {
+                    "raid_id": raid_id,
+                    "discord_id": discord_id,
+                    "role": role,
+                    "has_cleared": has_cleared,
+                }
+            )
+            events.append(
+                event_row(raid_id, discord_id, EventKind.JOIN, role, has_cleared)
+            )
+            if changes is not None:
+                changes.join(discord_id, role, has_cleared)
+            continue
+        if changes is not None:
+            changes.switch(user.role, role, user.has_cleared)
+            if user.has_cleared != has_cleared:
+                changes.clear(discord_id, role, has_cleared)
+        if user.role != role:
+            events.append(event_row(raid_id, discord_id, EventKind.ROLE, role=role))
+        if user.has_cleared != has_cleared:
+            events.append(
+                event_row(
+                    raid_id, discord_id, EventKind.CLEARED, has_cleared=has_cleared
+                )
+            )
+        user.role = role
+        user.has_cleared = has_cleared
+    if added:
+        session.execute(insert(model.RaidUser), added)
+    record_events(session, events)
+    apply_attendance(session, changes)
+    session.flush()
+    invalidate_roster(raid_id)
+
+
+def delete_raid_users_by_discord_ids(
+    session: Session,
+    raid_id: int,
+    discord_ids: list[int],
+) -> list[model.RaidUser]:
+    users = list(
+        session.scalars(
+            select(model.RaidUser).where(
+                (model.RaidUser.raid_id == raid_id)
+                & (model.RaidUser.discord_id.in_(discord_ids))
+            )
+        )
+    )
+    if not users:
+        return users
+    changes = attendance_changes(session, raid_id)
+    for user in users:
+        if changes is not None:
+            changes.leave(user.discord_id, user.role, user.has_cleared)
+    session.execute(
+        delete(model.RaidUser).where(model.RaidUser.id.in_([user.id for user in users]))
+    )
+    record_events(
+        session,
+        [event_row(raid_id, user.discord_id, EventKind.LEAVE) for user in users],
+    )
+    apply_attendance(session, changes)
+    invalidate_roster(raid_id)
+    return users
+
+
+def copy_raid_users(
+    session: Session,
+    source_raid_id: int,
+    target_raid_id: int,
+    move: bool = False,
+) -> list[int]:
+    # also runs on worker threads, so callers invalidate both rosters
+    source = list(
+        session.scalars(
+            select(model.RaidUser)
+            .where(model.RaidUser.raid_id == source_raid_id)
+            .order_by(model.RaidUser.id)
+        )
+    )
+    existing = set(
+        session.scalars(
+            select(model.RaidUser.discord_id).where(
+                model.RaidUser.raid_id == target_raid_id
+            )
+        )
+    )
+    target_changes = attendance_changes(session, target_raid_id)
+    source_changes = attendance_changes(session, source_raid_id) if move else None
+    copied = [user for user in source if user.discord_id not in existing]
+    for user in copied:
+        if target_changes is not None:
+            target_changes.join(user.discord_id, user.role, user.has_cleared)
+    if move:
+        for user in source:
+            if source_changes is not None:
+                source_changes.leave(
+                    user.discord_id, user.role, user.has_cleared, no_show=False
+                )
+    events = [
+        event_row(
+            target_raid_id,
+            user.discord_id,
+            EventKind.JOIN,
+            user.role,
+            user.has_cleared,
+        )
+        for user in copied
+    ]
+    if move:
+        events += [
+            event_row(source_raid_id, user.discord_id, EventKind.LEAVE)
+            for user in source
+        ]
+    if copied:
+        session.execute(
+            insert(model.RaidUser),
+            [
+                {
+                    "raid_id": target_raid_id,
+                    "discord_id": user.discord_id,
+                    "role": user.role,
+                    "has_cleared": user.has_cleared,
+                }
+                for user in copied
+            ],
+        )
+    if move and source:
+        session.execute(
+            delete(model.RaidUser).where(model.RaidUser.raid_id == source_raid_id)
+        )
+    record_events(session, events)
+    apply_attendance(session, target_changes)
+    apply_attendance(session, source_changes)
+    return [user.discord_id for user in copied]
+
+
+def reminder_times(when: int) -> list[int]:
+    return sorted({when - offset for offset in raid_cfg().raid_reminder_offsets})
+
+
+def reminder_lead(when: int, now: int) -> int:
+    # the offset of the latest reminder that is due, so a ping sent late
+    # still tells which reminder it is
+    return min(
+        (offset for offset in raid_cfg().raid_reminder_offsets if when - offset <= now),
+        default=max(when - now, 0),
+    )
+
+
+def next_reminder_at(when: int, now: int) -> int | None:
+    return next((at for at in reminder_times(when) if at > now), None)
+
+
+def take_due_reminders(session: Session, now: int, limit: int) -> list[int]:
+    # advances the watermark of up to limit due raids past now and returns the
+    # raids to ping; only the latest missed reminder is sent, and only within
+    # the misfire grace time, so a restart never pings twice
+    due: list[int] = []
+    for reminder, when in session.execute(
+        select(model.RaidReminder, model.Raid.when)
+        .join(model.Raid, model.Raid.id == model.RaidReminder.raid_id)
+        .where(model.RaidReminder.next_at <= now)
+        .order_by(model.RaidReminder.next_at)
+        .limit(limit)
+    ):
+        fired = max(at for at in reminder_times(when) + [reminder.next_at] if at <= now)
+        if now - fired <= raid_cfg().raid_misfire_grace_time:
+            due.append(reminder.raid_id)
+        next_at = next_reminder_at(when, now)
+        if next_at is None:
+            session.delete(reminder)
+        else:
+            reminder.next_at = next_at
+    session.flush()
+    return due
+
+
+@functools.cache
+def raid_queue() -> Queue[int]:
+    return Queue(raid_cfg().raid_ping_queue_size)
 
 
-def put_raid(raid_id: int) -> None:
-    raid_queue.put_nowait(raid_id)
+async def put_raid(raid_id: int) -> None:
+    # a coroutine, so legacy raid jobs run it on the event loop; waits while
+    # the queue is full instead of growing it
+    await raid_queue().put(raid_id)
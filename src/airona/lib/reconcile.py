@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from airona.db import model
+from airona.lib.raid import next_reminder_at
+from airona.lib.series import SERIES_JOB_PREFIX, schedule_series, series_job_id
+
+
+@dataclass(frozen=True, slots=True)
+class Reconciliation:
+    orphan_jobs: int
+    legacy_jobs: int
+    missing_reminders: int
+    missing_series_jobs: int
+    stale_jobs: frozenset[str]
+
+
+def reconcile_jobs(
+    raid_scheduler: AsyncIOScheduler,
+    jobstore: SQLAlchemyJobStore,
+    session: Session,
+    now: int,
+) -> Reconciliation:
+    # job ids are read straight from the job table, so no job is unpickled
+    with jobstore.engine.connect() as conn:
+        job_ids = set(conn.scalars(select(jobstore.jobs_t.c.id)))
+    raids = {
+        raid_id: when
+        for raid_id, when in session.execute(select(model.Raid.id, model.Raid.when))
+    }
+    reminded = set(session.scalars(select(model.RaidReminder.raid_id)))
+    series = {s.id: s for s in session.scalars(select(model.RaidSeries))}
+
+    raid_jobs = {int(job_id) for job_id in job_ids if job_id.isdecimal()}
+    series_jobs = {
+        int(job_id.removeprefix(SERIES_JOB_PREFIX))
+        for job_id in job_ids
+        if job_id.startswith(SERIES_JOB_PREFIX)
+    }
+
+    # per-raid jobs predate the reminder sweep; live ones become reminder rows
+    legacy = raid_jobs & raids.keys()
+    orphans = {str(raid_id) for raid_id in raid_jobs - raids.keys()} | {
+        series_job_id(series_id) for series_id in series_jobs - series.keys()
+    }
+    missing = 0
+    for raid_id in raids.keys() - reminded:
+        next_at = next_reminder_at(raids[raid_id], now)
+        if raid_id in legacy:
+            next_at = next_at or raids[raid_id]
+        if next_at is not None:
+            session.add(model.RaidReminder(raid_id=raid_id, next_at=next_at))
+            missing += raid_id not in legacy
+    session.flush()
+
+    for series_id in series.keys() - series_jobs:
+        schedule_series(raid_scheduler, series[series_id])
+
+    return Reconciliation(
+        len(orphans),
+        len(legacy),
+        missing,
+        len(series.keys() - series_jobs),
+        frozenset(orphans | {str(raid_id) for raid_id in legacy}),
+    )
+
+
+def remove_stale_jobs(
+    raid_scheduler: AsyncIOScheduler, job_ids: frozenset[str]
+) -> None:
+    # only called once the reminder rows that replace legacy jobs are
+    # committed, so a failed commit leaves the old jobs in place
+    for job_id in job_ids:
+        try:
+            raid_scheduler.remove_job(job_id)
+        except JobLookupError:
+            pass
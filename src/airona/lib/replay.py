@@ -0,0 +1,26 @@
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+
+
+class ReplayCache:
+    def __init__(self, ttl: float, max_size: int) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self.seen: OrderedDict[Hashable, float] = OrderedDict()
+        self.duplicates = 0
+
+    def check(self, key: Hashable) -> bool:
+        # returns whether key is new and records it; entries are kept in
+        # insertion order, so expired ones are always at the front
+        now = time.monotonic()
+        while self.seen:
+            oldest, expires = next(iter(self.seen.items()))
+            if expires > now and len(self.seen) < self.max_size:
+                break
+            del self.seen[oldest]
+        if key in self.seen:
+            self.duplicates += 1
+            return False
+        self.seen[key] = now + self.ttl
+        return True
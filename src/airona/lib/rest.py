@@ -0,0 +1,160 @@
+import asyncio
+import time
+from collections import Counter, defaultdict
+from collections.abc import AsyncIterator, Hashable
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from http import HTTPStatus
+
+from hikari import HTTPResponseError, InternalServerError, RateLimitTooLongError
+
+from airona.etc.tracing import tracer
+
+
+class Priority(IntEnum):
+    INTERACTION = 0
+    EDIT = 1
+    PING = 2
+    DM = 3
+    LIVENESS = 4
+
+
+# interaction callbacks go through the interaction webhook, which discord
+# rate limits apart from the channel routes
+INTERACTION_ROUTE = "interaction_callback"
+
+
+def is_transient(error: BaseException) -> bool:
+    if isinstance(error, (InternalServerError, RateLimitTooLongError)):
+        return True
+    if isinstance(error, HTTPResponseError):
+        return error.status == HTTPStatus.TOO_MANY_REQUESTS
+    return isinstance(error, (OSError, TimeoutError))
+
+
+class RouteBudget:
+    def __init__(self, capacity: int, period: float) -> None:
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiting: Counter[Priority] = Counter()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def idle(self) -> bool:
+        return self.tokens >= self.capacity and not any(self.waiting.values())
+
+
+class RestBudget:
+    def __init__(
+        self,
+        capacity: int,
+        period: float,
+        reserve: int,
+        max_routes: int,
+    ) -> None:
+        self.capacity = capacity
+        self.period = period
+        self.reserve = reserve
+        self.max_routes = max_routes
+
+        self.routes: dict[Hashable, RouteBudget] = {}
+
+        self.calls: Counter[Priority] = Counter()
+        self.waits: Counter[Priority] = Counter()
+        self.wait_time: defaultdict[Priority, float] = defaultdict(float)
+        self.rate_limited: Counter[Priority] = Counter()
+
+    def floor(self, priority: Priority) -> int:
+        # tokens that must remain after this call, so each background class
+        # leaves headroom for the classes above it
+        return min(self.reserve * (priority - Priority.EDIT), self.capacity - 1)
+
+    def route(self, key: Hashable) -> RouteBudget:
+        budget = self.routes.get(key)
+        if budget is None:
+            if len(self.routes) >= self.max_routes:
+                for idle in [k for k, b in self.routes.items() if b.idle()]:
+                    del self.routes[idle]
+            # with no idle route the oldest go; calls already holding one keep
+            # using it, the route only loses its history
+            while len(self.routes) >= self.max_routes:
+                del self.routes[next(iter(self.routes))]
+            budget = self.routes[key] = RouteBudget(self.capacity, self.period)
+        return budget
+
+    async def acquire(self, priority: Priority, key: Hashable) -> RouteBudget:
+        budget = self.route(key)
+        self.calls[priority] += 1
+        if priority == Priority.INTERACTION:
+            # interaction responses never wait; they overdraw their own route
+            # so that bursts still show up in the metrics
+            budget.refill(time.monotonic())
+            budget.tokens = max(budget.tokens - 1, -self.capacity)
+            return budget
+        floor = self.floor(priority)
+        started = time.monotonic()
+        budget.waiting[priority] += 1
+        try:
+            while True:
+                now = time.monotonic()
+                budget.refill(now)
+                ahead = any(budget.waiting[p] for p in Priority if p < priority)
+                if (
+                    now >= budget.blocked_until
+                    and not ahead
+                    and budget.tokens - 1 >= floor
+                ):
+                    budget.tokens -= 1
+                    break
+                delay = max(
+                    budget.blocked_until - now,
+                    (floor + 1 - budget.tokens) / budget.rate,
+                    0.05,
+                )
+                await asyncio.sleep(delay)
+        finally:
+            budget.waiting[priority] -= 1
+        waited = time.monotonic() - started
+        if waited >= 0.05:
+            self.waits[priority] += 1
+            self.wait_time[priority] += waited
+        return budget
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, key: Hashable) -> AsyncIterator[None]:
+        with tracer().span(f"rest {priority.name.lower()}") as span:
+            started = time.monotonic()
+            budget = await self.acquire(priority, key)
+            if span is not None:
+                span.set("rest.route", str(key))
+                span.set("rest.wait_ms", (time.monotonic() - started) * 1000)
+            try:
+                yield
+            except RateLimitTooLongError as e:
+                self.throttle(priority, budget, e.retry_after)
+                raise
+            except HTTPResponseError as e:
+                if e.status == HTTPStatus.TOO_MANY_REQUESTS:
+                    self.throttle(priority, budget, self.period)
+                raise
+
+    def throttle(self, priority: Priority, budget: RouteBudget, delay: float) -> None:
+        self.rate_limited[priority] += 1
+        budget.tokens = 0
+        budget.blocked_until = time.monotonic() + delay
+
+    def metrics(self) -> dict[str, dict[str, float]]:
+        return {
+            priority.name.lower(): {
+                "calls": self.calls[priority],
+                "waits": self.waits[priority],
+                "wait_time": self.wait_time[priority],
+                "rate_limited": self.rate_limited[priority],
+            }
+            for priority in Priority
+        }
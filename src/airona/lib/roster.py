@@ -0,0 +1,108 @@
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from enum import StrEnum
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from airona.db import model
+from airona.env import raid_cfg
+from airona.lib.listing import invalidate_listings
+
+
+class Role(StrEnum):
+    DPS = "dps"
+    TANK = "tank"
+    SUPPORT = "support"
+
+
+USER_ROLE_DPS = Role.DPS
+USER_ROLE_TANK = Role.TANK
+USER_ROLE_SUPPORT = Role.SUPPORT
+
+
+@dataclass(frozen=True, slots=True)
+class RaidUserSnapshot:
+    discord_id: int
+    role: Role
+    has_cleared: bool
+
+
+@dataclass(frozen=True, slots=True)
+class RaidSnapshot:
+    id: int
+    guild_id: int
+    channel_id: int
+    message_id: int
+    host_discord_id: int
+    host_username: str
+    host_uid: str
+    when: int
+    title: str
+    users: tuple[RaidUserSnapshot, ...]
+
+    def user_mentions(self) -> list[int]:
+        return [self.host_discord_id] + [user.discord_id for user in self.users]
+
+
+roster_cache: OrderedDict[int, RaidSnapshot] = OrderedDict()
+
+
+def cache_roster(snapshot: RaidSnapshot) -> None:
+    roster_cache[snapshot.id] = snapshot
+    roster_cache.move_to_end(snapshot.id)
+    while len(roster_cache) > raid_cfg().raid_roster_cache_size:
+        roster_cache.popitem(last=False)
+
+
+def snapshot_raid(raid: model.Raid, users: Iterable[model.RaidUser]) -> RaidSnapshot:
+    return RaidSnapshot(
+        int(raid.id),
+        int(raid.guild_id),
+        int(raid.channel_id),
+        int(raid.message_id),
+        int(raid.host_discord_id),
+        raid.host_username,
+        raid.host_uid,
+        int(raid.when),
+        raid.title,
+        tuple(
+            RaidUserSnapshot(int(u.discord_id), Role(u.role), bool(u.has_cleared))
+            for u in users
+        ),
+    )
+
+
+def load_raid_snapshot(session: Session, raid: model.Raid) -> RaidSnapshot:
+    users = session.scalars(
+        select(model.RaidUser)
+        .where(model.RaidUser.raid_id == raid.id)
+        .order_by(model.RaidUser.id)
+    )
+    return snapshot_raid(raid, users)
+
+
+def get_raid_snapshot(session: Session, raid_id: int) -> RaidSnapshot | None:
+    # only call this from read-only transactions; the result is cached
+    snapshot = roster_cache.get(raid_id)
+    if snapshot is not None:
+        roster_cache.move_to_end(raid_id)
+        return snapshot
+    raid = session.get(model.Raid, raid_id)
+    if raid is None:
+        return None
+    snapshot = load_raid_snapshot(session, raid)
+    cache_roster(snapshot)
+    return snapshot
+
+
+def invalidate_roster(raid_id: int) -> None:
+    roster_cache.pop(raid_id, None)
+    invalidate_listings()
+
+
+def invalidate_guild_rosters(guild_id: int) -> None:
+    for raid_id in [r.id for r in roster_cache.values() if r.guild_id == guild_id]:
+        del roster_cache[raid_id]
+    invalidate_listings()
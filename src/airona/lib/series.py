@@ -0,0 +1,172 @@
+import functools
+from asyncio import Queue
+from datetime import UTC, datetime
+
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.date import DateTrigger
+from hikari import Snowflakeish
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from airona.db import model
+from airona.env import raid_cfg
+from airona.lib.raid import copy_raid_users, create_raid
+
+SERIES_JOB_PREFIX = "series:"
+
+
+def series_job_id(series_id: int) -> str:
+    return f"{SERIES_JOB_PREFIX}{series_id}"
+
+
+def schedule_series(raid_scheduler: AsyncIOScheduler, series: model.RaidSeries) -> None:
+    # only the next occurrence is ever scheduled, so the job store holds one
+    # job per series no matter how long it runs
+    run_at = max(
+        series.next_when - raid_cfg().raid_series_lead_time,
+        int(datetime.now(UTC).timestamp()),
+    )
+    raid_scheduler.add_job(
+        id=series_job_id(series.id),
+        replace_existing=True,
+        trigger=DateTrigger(run_date=datetime.fromtimestamp(run_at, tz=UTC)),
+        coalesce=True,
+        misfire_grace_time=None,
+        func=put_series,
+        args=(series.id,),
+    )
+
+
+def create_series(
+    raid_scheduler: AsyncIOScheduler,
+    session: Session,
+    guild_id: Snowflakeish,
+    channel_id: Snowflakeish,
+    host_discord_id: Snowflakeish,
+    host_username: str,
+    host_uid: str,
+    when: int,
+    title: str,
+    period: int,
+    carry_roster: bool,
+) -> model.RaidSeries:
+    if period < 3600:
+        raise ValueError("Raids cannot repeat more than once an hour.")
+    datetime.fromtimestamp(when, tz=UTC)
+    if session.get(model.Guild, guild_id) is None:
+        session.add(model.Guild(id=guild_id))
+    series = model.RaidSeries(
+        guild_id=guild_id,
+        channel_id=channel_id,
+        host_discord_id=host_discord_id,
+        host_username=host_username,
+        host_uid=host_uid,
+        title=title,
+        next_when=when,
+        period=period,
+        carry_roster=carry_roster,
+    )
+    session.add(series)
+    session.flush()
+    schedule_series(raid_scheduler, series)
+    return series
+
+
+def get_series_by_id(session: Session, series_id: int) -> model.RaidSeries | None:
+    return session.get(model.RaidSeries, series_id)
+
+
+def get_series(
+    session: Session,
+    guild_id: Snowflakeish,
+    series_id: int,
+) -> model.RaidSeries | None:
+    series = get_series_by_id(session, series_id)
+    if series is None or series.guild_id != guild_id:
+        return None
+    return series
+
+
+def get_guild_series(
+    session: Session,
+    guild_id: Snowflakeish,
+) -> list[model.RaidSeries]:
+    return list(
+        session.scalars(
+            select(model.RaidSeries)
+            .where(model.RaidSeries.guild_id == guild_id)
+            .order_by(model.RaidSeries.next_when)
+        )
+    )
+
+
+def delete_series(
+    raid_scheduler: AsyncIOScheduler,
+    session: Session,
+    guild_id: Snowflakeish,
+    series_id: int,
+) -> model.RaidSeries:
+    series = get_series(session, guild_id, series_id)
+    if series is None:
+        raise IndexError("Series does not exist.")
+    try:
+        raid_scheduler.remove_job(series_job_id(series.id))
+    except JobLookupError:
+        pass
+    session.delete(series)
+    return series
+
+
+def next_occurrence(series: model.RaidSeries, now: int) -> int:
+    when = series.next_when
+    if when <= now:
+        # occurrences missed while the bot was down are skipped
+        when += ((now - when) // series.period + 1) * series.period
+    return when
+
+
+def materialize_series(
+    raid_scheduler: AsyncIOScheduler,
+    session: Session,
+    series: model.RaidSeries,
+    when: int,
+    message_id: Snowflakeish,
+) -> tuple[model.Raid, int]:
+    raid = create_raid(
+        session,
+        series.guild_id,
+        series.channel_id,
+        message_id,
+        series.host_discord_id,
+        series.host_username,
+        series.host_uid,
+        when,
+        series.title,
+    )
+    carried = 0
+    if series.carry_roster and series.last_raid_id is not None:
+        carried = len(copy_raid_users(session, series.last_raid_id, raid.id))
+    advance_series(raid_scheduler, series, when)
+    series.last_raid_id = raid.id
+    return raid, carried
+
+
+def advance_series(
+    raid_scheduler: AsyncIOScheduler,
+    series: model.RaidSeries,
+    when: int,
+) -> None:
+    series.next_when = when + series.period
+    schedule_series(raid_scheduler, series)
+
+
+@functools.cache
+def series_queue() -> Queue[int]:
+    return Queue(raid_cfg().raid_series_queue_size)
+
+
+async def put_series(series_id: int) -> None:
+    # a coroutine, so series jobs run it on the event loop; waits while the
+    # queue is full instead of growing it
+    await series_queue().put(series_id)
@@ -0,0 +1,240 @@
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from airona.db import model
+from airona.env import raid_cfg
+
+BACKFILL_CURSOR = "attendance_backfill_cursor"
+BACKFILL_END = "attendance_backfill_end"
+PENDING_BACKFILL_RANGE = "pending_backfill_range"
+
+
+@dataclass(slots=True)
+class Attendance:
+    signups: int = 0
+    clears: int = 0
+    no_shows: int = 0
+
+
+# raids in (cursor, end] are counted by the backfill, not by mutations
+backfill_range: tuple[int, int] | None = None
+
+
+def publish_backfill_range(session: Session) -> None:
+    global backfill_range
+    pending = session.info.pop(PENDING_BACKFILL_RANGE, None)
+    if pending is not None:
+        backfill_range = pending
+
+
+def discard_backfill_range(session: Session) -> None:
+    session.info.pop(PENDING_BACKFILL_RANGE, None)
+
+
+def stage_backfill_range(session: Session, value: tuple[int, int]) -> None:
+    # the cached range only moves once the meta rows that hold it are
+    # committed; until then this session alone sees the new range
+    if not event.contains(session, "after_commit", publish_backfill_range):
+        event.listen(session, "after_commit", publish_backfill_range)
+        event.listen(session, "after_rollback", discard_backfill_range)
+    session.info[PENDING_BACKFILL_RANGE] = value
+
+
+def load_backfill_range(session: Session) -> tuple[int, int]:
+    global backfill_range
+    pending = session.info.get(PENDING_BACKFILL_RANGE)
+    if pending is not None:
+        return pending
+    if backfill_range is None:
+        meta = {
+            key: value
+            for key, value in session.execute(
+                select(model.Meta.key, model.Meta.value).where(
+                    model.Meta.key.in_([BACKFILL_CURSOR, BACKFILL_END])
+                )
+            )
+        }
+        if BACKFILL_END not in meta:
+            meta[BACKFILL_CURSOR] = 0
+            meta[BACKFILL_END] = (
+                session.scalar(select(func.coalesce(func.max(model.Raid.id), 0))) or 0
+            )
+            session.add_all(
+                model.Meta(key=key, value=value) for key, value in meta.items()
+            )
+            stage_backfill_range(session, (meta[BACKFILL_CURSOR], meta[BACKFILL_END]))
+            return meta[BACKFILL_CURSOR], meta[BACKFILL_END]
+        backfill_range = meta[BACKFILL_CURSOR], meta[BACKFILL_END]
+    return backfill_range
+
+
+def tracked(session: Session, raid_id: int) -> bool:
+    cursor, end = load_backfill_range(session)
+    return raid_id <= cursor or raid_id > end
+
+
+class AttendanceChanges:
+    def __init__(self, guild_id: int, when: int) -> None:
+        self.guild_id = guild_id
+        self.when = when
+        self.users: Counter[tuple[int, str]] = Counter()
+        self.roles: Counter[tuple[str, str]] = Counter()
+
+    def add(self, discord_id: int, role: str, column: str, delta: int) -> None:
+        if delta:
+            self.users[int(discord_id), column] += delta
+            self.roles[role, column] += delta
+
+    def join(self, discord_id: int, role: str, has_cleared: bool | None) -> None:
+        self.add(discord_id, role, "signups", 1)
+        self.add(discord_id, role, "clears", int(bool(has_cleared)))
+
+    def leave(
+        self,
+        discord_id: int,
+        role: str,
+        has_cleared: bool | None,
+        no_show: bool = True,
+    ) -> None:
+        # signing off shortly before the start (or after it) is a no-show;
+        # earlier sign-offs are not counted at all
+        late = self.when - raid_cfg().raid_no_show_window <= time.time()
+        if no_show and late:
+            self.add(discord_id, role, "no_shows", 1)
+        else:
+            self.add(discord_id, role, "signups", -1)
+        self.add(discord_id, role, "clears", -int(bool(has_cleared)))
+
+    def switch(self, old: str, new: str, has_cleared: bool | None) -> None:
+        if old == new:
+            return
+        for role, sign in ((old, -1), (new, 1)):
+            self.roles[role, "signups"] += sign
+            self.roles[role, "clears"] += sign * int(bool(has_cleared))
+
+    def clear(self, discord_id: int, role: str, has_cleared: bool) -> None:
+        self.add(discord_id, role, "clears", 1 if has_cleared else -1)
+
+
+def attendance_changes(session: Session, raid_id: int) -> AttendanceChanges | None:
+    if not tracked(session, raid_id):
+        return None
+    raid = session.get(model.Raid, raid_id)
+    if raid is None:
+        return None
+    return AttendanceChanges(int(raid.guild_id), int(raid.when))
+
+
+def upsert_rows(
+    session: Session,
+    table: type[model.UserAttendance] | type[model.RoleAttendance],
+    rows: list[dict],
+) -> None:
+    if not rows:
+        return
+    stmt = insert(table)
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=list(inspect(table).primary_key),
+            set_={
+                column: getattr(table, column) + getattr(stmt.excluded, column)
+                for column in ("signups", "clears", "no_shows")
+            },
+        ),
+        rows,
+    )
+
+
+def collect[T: (int, str)](
+    counter: Counter[tuple[T, str]], key: str, guild_id: int
+) -> list[dict]:
+    rows: dict[T, dict] = {}
+    for (ident, column), delta in counter.items():
+        row = rows.setdefault(
+            ident,
+            {
+                "guild_id": guild_id,
+                key: ident,
+                "signups": 0,
+                "clears": 0,
+                "no_shows": 0,
+            },
+        )
+        row[column] += delta
+    return [
+        row
+        for row in rows.values()
+        if row["signups"] or row["clears"] or row["no_shows"]
+    ]
+
+
+def apply_attendance(session: Session, changes: AttendanceChanges | None) -> None:
+    # each aggregate table gets a single executemany upsert per mutation
+    if changes is None:
+        return
+    upsert_rows(
+        session,
+        model.UserAttendance,
+        collect(changes.users, "discord_id", changes.guild_id),
+    )
+    upsert_rows(
+        session,
+        model.RoleAttendance,
+        collect(changes.roles, "role", changes.guild_id),
+    )
+
+
+def get_user_attendance(session: Session, guild_id: int, discord_id: int) -> Attendance:
+    row = session.get(model.UserAttendance, (guild_id, discord_id))
+    if row is None:
+        return Attendance()
+    return Attendance(row.signups, row.clears, row.no_shows)
+
+
+def get_role_attendance(session: Session, guild_id: int) -> dict[str, Attendance]:
+    return {
+        row.role: Attendance(row.signups, row.clears, row.no_shows)
+        for row in session.scalars(
+            select(model.RoleAttendance).where(
+                model.RoleAttendance.guild_id == guild_id
+            )
+        )
+    }
+
+
+def backfill_attendance(session: Session, batch_size: int) -> bool:
+    # counts the current rosters of raids that existed before the aggregates
+    # did, one batch of raids per call; returns whether it is done
+    cursor, end = load_backfill_range(session)
+    if cursor >= end:
+        return True
+    raids = list(
+        session.scalars(
+            select(model.Raid)
+            .where((model.Raid.id > cursor) & (model.Raid.id <= end))
+            .order_by(model.Raid.id)
+            .limit(batch_size)
+        )
+    )
+    batch_end = raids[-1].id if len(raids) == batch_size else end
+    guilds = {raid.id: raid.guild_id for raid in raids}
+    changes: dict[int, AttendanceChanges] = {}
+    for user in session.scalars(
+        select(model.RaidUser).where(model.RaidUser.raid_id.in_(guilds))
+    ):
+        guild_id = guilds[user.raid_id]
+        changes.setdefault(guild_id, AttendanceChanges(guild_id, 0)).join(
+            user.discord_id, user.role, user.has_cleared
+        )
+    for guild_changes in changes.values():
+        apply_attendance(session, guild_changes)
+    session.merge(model.Meta(key=BACKFILL_CURSOR, value=batch_end))
+    session.merge(model.Meta(key=BACKFILL_END, value=end))
+    session.flush()
+    stage_backfill_range(session, (batch_end, end))
+    return batch_end >= end
@@ -0,0 +1,343 @@
+import logging
+import re
+import string
+from collections import OrderedDict
+from collections.abc import Sequence
+from pathlib import Path
+
+from hikari import Emoji, Snowflakeish
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from airona.db import model
+from airona.env import RAID_CFG_PATH, RaidConfig, load_raid_cfg, raid_cfg, set_raid_cfg
+from airona.lib.roster import RaidUserSnapshot, Role
+
+logger = logging.getLogger(__name__)
+
+
+def raid_message_link(
+    guild_id: Snowflakeish | None,
+    channel_id: Snowflakeish | None,
+    message_id: Snowflakeish | None,
+) -> str:
+    if message_id is None:
+        return f"https://discord.com/channels/{guild_id}/{channel_id}"
+    return f"https://discord.com/channels/{guild_id}/{channel_id}/{message_id}"
+
+
+MENTION = re.compile(r"<@!?(\d+)>")
+
+
+def split_mentions(
+    message: str,
+    max_length: int,
+    max_mentions: int,
+) -> list[tuple[str, list[int]]]:
+    # splits only on whitespace, so a mention is never cut in half; each chunk
+    # stays within max_length characters and max_mentions user mentions
+    chunks: list[tuple[str, list[int]]] = []
+    parts: list[str] = []
+    length = 0
+    mentions: list[int] = []
+
+    def flush() -> None:
+        nonlocal length
+        text = "".join(parts).strip()
+        if text:
+            chunks.append((text, list(mentions)))
+        parts.clear()
+        mentions.clear()
+        length = 0
+
+    for token in re.split(r"(\s+)", message):
+        while len(token) > max_length:
+            flush()
+            parts.append(token[:max_length])
+            flush()
+            token = token[max_length:]
+        ids = [int(i) for i in MENTION.findall(token)]
+        if length + len(token) > max_length or len(mentions) + len(ids) > max_mentions:
+            flush()
+            if token.isspace():
+                continue
+        parts.append(token)
+        length += len(token)
+        mentions.extend(ids)
+    flush()
+    return chunks
+
+
+def format_lead(seconds: int) -> str:
+    parts = []
+    for unit, size in (("day", 86400), ("hour", 3600), ("minute", 60)):
+        count, seconds = divmod(seconds, size)
+        if count:
+            parts.append(f"{count} {unit}" + ("s" if count != 1 else ""))
+    return f"in {' '.join(parts)}" if parts else "now"
+
+
+def build_template_values(
+    raid_config: RaidConfig,
+    when: int,
+    title: str,
+    host_discord_id: int,
+    users: Sequence[RaidUserSnapshot],
+    host_name: str | None,
+    host_uid: str | None,
+    guild_id: Snowflakeish | None,
+    channel_id: Snowflakeish | None,
+    message_id: Snowflakeish | None,
+) -> dict[str, object]:
+    mentions: dict[tuple[Role, bool], list[str]] = {
+        (role, has_cleared): [] for role in Role for has_cleared in (False, True)
+    }
+    for u in users:
+        mentions.setdefault((u.role, u.has_cleared), []).append(f"<@{u.discord_id}>")
+
+    values: dict[str, object] = {
+        "when": when,
+        "title": title,
+        "host_mention": f"<@{host_discord_id}>",
+        "host_username": host_name,
+        "host_uid": host_uid,
+        "dps_emoji": raid_config.emoji.dps,
+        "tank_emoji": raid_config.emoji.tank,
+        "support_emoji": raid_config.emoji.support,
+        "has_cleared_emoji": raid_config.emoji.has_cleared,
+        "users": " ".join(f"<@{u.discord_id}>" for u in users),
+        "raid_message_link": raid_message_link(guild_id, channel_id, message_id),
+        "total": len(users),
+        "total_cleared": sum(1 for u in users if u.has_cleared),
+    }
+    for role in Role:
+        need_clear = " ".join(mentions[role, False])
+        cleared = " ".join(mentions[role, True])
+        separator = raid_config.emoji.has_cleared if cleared else ""
+        values[f"{role}_need_clear"] = need_clear
+        values[f"{role}_separator"] = separator
+        values[f"{role}_cleared"] = cleared
+        values[f"{role}_users"] = f"{need_clear} {separator} {cleared}"
+        values[f"{role}_total"] = len(mentions[role, False]) + len(mentions[role, True])
+    return values
+
+
+class RaidTemplates:
+    def __init__(self, config: RaidConfig, base: RaidConfig | None = None) -> None:
+        self.config = config
+        # the raid.toml config this was derived from
+        self.base = config if base is None else base
+
+        self.dps_emoji = Emoji.parse(config.emoji.dps)
+        self.tank_emoji = Emoji.parse(config.emoji.tank)
+        self.support_emoji = Emoji.parse(config.emoji.support)
+        self.has_cleared_emoji = Emoji.parse(config.emoji.has_cleared)
+        self.sign_off_emoji = Emoji.parse(config.emoji.sign_off)
+
+        # render every template once against placeholder values so that
+        # unknown fields and malformed format strings fail here, not per click
+        values = build_template_values(config, 0, "", 0, [], "", "", 0, 0, 0)
+        for name, template, extra in (
+            ("raid_message_template", config.raid_message_template, {}),
+            ("raid_ping_template", config.raid_ping_template, {"lead": ""}),
+            (
+                "raid_removal_dm_template",
+                config.raid_removal_dm_template,
+                {"raid_removal_reason": ""},
+            ),
+        ):
+            try:
+                template.format_map(values | extra)
+            except (KeyError, IndexError, AttributeError, ValueError) as e:
+                raise ValueError(f"Invalid {name}: {e!r}") from e
+        try:
+            config.raid_initial_thread_message_template.format_map(
+                {"raid_message_link": ""}
+            )
+        except (KeyError, IndexError, AttributeError, ValueError) as e:
+            raise ValueError(
+                f"Invalid raid_initial_thread_message_template: {e!r}"
+            ) from e
+
+
+_raid_templates: RaidTemplates | None = None
+_raid_cfg_mtime: int | None = None
+
+
+def raid_templates() -> RaidTemplates:
+    global _raid_templates
+    config = raid_cfg()
+    if _raid_templates is None or _raid_templates.config is not config:
+        _raid_templates = RaidTemplates(config)
+    return _raid_templates
+
+
+TEMPLATE_FIELDS = (
+    "raid_message_template",
+    "raid_ping_template",
+    "raid_removal_dm_template",
+    "raid_initial_thread_message_template",
+)
+EMOJI_FIELDS = ("dps", "tank", "support", "has_cleared", "sign_off")
+
+CUSTOM_EMOJI = re.compile(r"<a?:\w{2,32}:(\d+)>")
+PICTOGRAPH = (
+    "[\u00a9\u00ae\u203c\u2049\u2122\u2139\u2194-\u2199\u21a9\u21aa"
+    "\u231a-\u23ff\u24c2\u25aa-\u27bf\u2934\u2935\u2b05-\u2b55\u3030\u303d"
+    "\u3297\u3299\U0001f000-\U0001faff]"
+)
+EMOJI_ELEMENT = (
+    "\U0001f3f4[\U000e0020-\U000e007e]+\U000e007f"
+    "|[\U0001f1e6-\U0001f1ff]{2}"
+    "|[#*0-9]\ufe0f?\u20e3"
+    f"|{PICTOGRAPH}\ufe0f?[\U0001f3fb-\U0001f3ff]?"
+)
+# a single emoji: flags, keycaps and pictographs, optionally joined with ZWJ
+UNICODE_EMOJI = re.compile(f"(?:{EMOJI_ELEMENT})(?:\u200d(?:{EMOJI_ELEMENT}))*")
+
+guild_templates: OrderedDict[int, RaidTemplates] = OrderedDict()
+
+
+def custom_emoji_id(value: str) -> int | None:
+    match = CUSTOM_EMOJI.fullmatch(value)
+    return None if match is None else int(match[1])
+
+
+def check_guild_template(guild_template: model.GuildTemplate) -> None:
+    # overrides come from server admins, so unlike raid.toml they may only
+    # substitute plain fields; format specs like {when:>9999999} would let
+    # them build huge strings on every render
+    max_length = raid_cfg().raid_template_max_length
+    for name in TEMPLATE_FIELDS:
+        template = getattr(guild_template, name)
+        if template is None:
+            continue
+        if len(template) > max_length:
+            raise ValueError(f"Templates are limited to {max_length} characters.")
+        for _, field, spec, conversion in string.Formatter().parse(template):
+            if field is not None and (spec or conversion or not field.isidentifier()):
+                raise ValueError(
+                    "Templates may only use plain fields like {title}, "
+                    "without format specs or conversions."
+                )
+    for name in EMOJI_FIELDS:
+        emoji = getattr(guild_template, f"{name}_emoji")
+        if emoji is None or custom_emoji_id(emoji) is not None:
+            continue
+        if UNICODE_EMOJI.fullmatch(emoji) is None:
+            raise ValueError(f"{emoji} is not an emoji.")
+
+
+def apply_guild_template(
+    config: RaidConfig, guild_template: model.GuildTemplate
+) -> RaidConfig:
+    update: dict[str, object] = {
+        name: value
+        for name in TEMPLATE_FIELDS
+        if (value := getattr(guild_template, name)) is not None
+    }
+    update["emoji"] = config.emoji.model_copy(
+        update={
+            name: value
+            for name in EMOJI_FIELDS
+            if (value := getattr(guild_template, f"{name}_emoji")) is not None
+        }
+    )
+    return config.model_copy(update=update)
+
+
+def cached_guild_templates(guild_id: int) -> RaidTemplates | None:
+    templates = guild_templates.get(guild_id)
+    # entries derived from a raid.toml that has since been reloaded are stale
+    if templates is None or templates.base is not raid_cfg():
+        return None
+    guild_templates.move_to_end(guild_id)
+    return templates
+
+
+def load_guild_templates(session: Session, guild_id: int) -> RaidTemplates:
+    # guilds without overrides share the default templates, so that every
+    # guild costs one lookup after its first render
+    templates = raid_templates()
+    guild_template = session.get(model.GuildTemplate, guild_id)
+    if guild_template is not None:
+        try:
+            check_guild_template(guild_template)
+            templates = RaidTemplates(
+                apply_guild_template(templates.config, guild_template),
+                templates.config,
+            )
+        except ValueError as e:
+            logger.warning("Using the default templates for guild %d: %s", guild_id, e)
+    guild_templates[guild_id] = templates
+    guild_templates.move_to_end(guild_id)
+    while len(guild_templates) > raid_cfg().raid_template_cache_size:
+        guild_templates.popitem(last=False)
+    return templates
+
+
+def invalidate_guild_templates(guild_id: Snowflakeish) -> None:
+    guild_templates.pop(int(guild_id), None)
+
+
+def get_guild_template(
+    session: Session, guild_id: Snowflakeish
+) -> model.GuildTemplate | None:
+    return session.get(model.GuildTemplate, guild_id)
+
+
+def set_guild_template(
+    session: Session, guild_id: Snowflakeish, field: str, value: str | None
+) -> None:
+    # the overrides are compiled before they are stored, so an invalid
+    # template fails the command instead of every later render. custom emojis
+    # must belong to the guild, which the caller checks
+    guild_template = session.get(model.GuildTemplate, guild_id)
+    if guild_template is None:
+        if value is None:
+            return
+        if session.get(model.Guild, guild_id) is None:
+            session.add(model.Guild(id=guild_id))
+        guild_template = model.GuildTemplate(guild_id=guild_id)
+        session.add(guild_template)
+    setattr(guild_template, field, value)
+    check_guild_template(guild_template)
+    config = raid_cfg()
+    RaidTemplates(apply_guild_template(config, guild_template), config)
+
+
+def delete_guild_template(session: Session, guild_id: Snowflakeish) -> None:
+    session.execute(
+        delete(model.GuildTemplate).where(model.GuildTemplate.guild_id == guild_id)
+    )
+
+
+def reload_raid_templates() -> RaidTemplates:
+    global _raid_templates
+    templates = RaidTemplates(load_raid_cfg())
+    # swap only once the new config has been fully validated and compiled
+    set_raid_cfg(templates.config)
+    _raid_templates = templates
+    return templates
+
+
+async def reload_raid_templates_if_changed() -> bool:
+    # a coroutine, so the scheduler runs it on the event loop and the
+    # templates are never swapped while a handler is rendering them
+    global _raid_cfg_mtime
+    mtime = Path(RAID_CFG_PATH).stat().st_mtime_ns
+    if _raid_cfg_mtime is None:
+        _raid_cfg_mtime = mtime
+        return False
+    if mtime == _raid_cfg_mtime:
+        return False
+    _raid_cfg_mtime = mtime
+    try:
+        reload_raid_templates()
+    except Exception:
+        logger.exception(
+            "Failed to reload %s, keeping the current config", RAID_CFG_PATH
+        )
+        return False
+    logger.info("Reloaded %s", RAID_CFG_PATH)
+    return True
@@ -0,0 +1,73 @@
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from airona import env
+from airona.db.connection import db
+from airona.db.model import Base
+from airona.lib import stats
+from airona.lib.roster import roster_cache
+
+CONFIG = """
+[db]
+url = "sqlite:///save/airona.db"
+
+[apscheduler]
+jobstore = "sqlite:///save/jobstore.db"
+
+[sqlalchemy]
+enforce_query_budgets = true
+"""
+
+RAID_CONFIG = """
+raid_cleanup_interval = 30
+raid_misfire_grace_time = 600
+
+raid_message_template = "{title} <t:{when}:F> {dps_users} {tank_users} {support_users}"
+raid_ping_template = "{title}: {users}"
+raid_removal_dm_template = "{title}: {raid_removal_reason}"
+raid_initial_thread_message_template = "{raid_message_link}"
+
+[emoji]
+dps = "<:dps:1>"
+tank = "<:tank:2>"
+support = "<:support:3>"
+has_cleared = "\N{THUMBS UP SIGN}"
+sign_off = "\N{CROSS MARK}"
+"""
+
+
+@pytest.fixture(autouse=True)
+def airona_env(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    (tmp_path / "env").mkdir()
+    (tmp_path / "save").mkdir()
+    (tmp_path / "env" / "config.toml").write_text(CONFIG)
+    (tmp_path / "env" / "raid.toml").write_text(RAID_CONFIG)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(env, "_raid_cfg", None)
+    monkeypatch.setattr(stats, "backfill_range", None)
+    env.cfg.cache_clear()
+    db.cache_clear()
+    roster_cache.clear()
+    Base.metadata.create_all(db().engine)
+    yield
+    db().engine.dispose()
+    db.cache_clear()
+    env.cfg.cache_clear()
+
+
+class FakeContext:
+    def __init__(self, guild_id: int = 1, user_id: int = 100) -> None:
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.responses: list[str] = []
+
+    async def respond(self, content: Any = None, **_: Any) -> None:
+        self.responses.append(str(content))
+
+
+@pytest.fixture
+def ctx() -> FakeContext:
+    return FakeContext()
@@ -0,0 +1,25 @@
+import pytest
+
+from airona.db import model
+from airona.db.connection import db
+from airona.db.profile import QueryBudgetError, query_scope
+
+
+def test_overrun_rolls_back() -> None:
+    with pytest.raises(QueryBudgetError):
+        with query_scope("test.overrun", 1), db().sm.begin() as session:
+            session.add(model.Guild(id=1))
+            session.flush()
+            session.add(model.Guild(id=2))
+    with db().sm.begin() as session:
+        assert session.get(model.Guild, 1) is None
+        assert session.get(model.Guild, 2) is None
+
+
+def test_within_budget_commits() -> None:
+    with query_scope("test.within", 2), db().sm.begin() as session:
+        session.add(model.Guild(id=1))
+        session.flush()
+        session.add(model.Guild(id=2))
+    with db().sm.begin() as session:
+        assert session.get(model.Guild, 2) is not None
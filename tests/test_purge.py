@@ -0,0 +1,54 @@
+import time
+from typing import cast
+
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import func, select
+
+from airona.db import model
+from airona.db.connection import db
+from airona.lib.purge import purge_guild_raids
+from airona.lib.raid import create_raid, create_raid_user
+
+
+class FakeScheduler:
+    def __init__(self, jobs: set[str]) -> None:
+        self.jobs = jobs
+
+    def remove_job(self, job_id: str) -> None:
+        if job_id not in self.jobs:
+            raise JobLookupError(job_id)
+        self.jobs.remove(job_id)
+
+
+def test_purge_returns_raids_and_removes_legacy_jobs() -> None:
+    fake = FakeScheduler({"1", "3", "other"})
+    scheduler = cast(AsyncIOScheduler, fake)
+    with db().sm.begin() as session:
+        for guild_id, message_id in ((1, 10), (1, 11), (2, 12)):
+            raid = create_raid(
+                session,
+                guild_id,
+                2,
+                message_id,
+                100,
+                "host",
+                "1",
+                int(time.time()) + 3600,
+                "title",
+            )
+            create_raid_user(session, raid.id, 5, "dps", False)
+
+    purged = []
+    while True:
+        with db().sm.begin() as session:
+            raid_ids = purge_guild_raids(scheduler, session, 1, 1)
+        if not raid_ids:
+            break
+        purged += raid_ids
+
+    assert sorted(purged) == [1, 2]
+    assert fake.jobs == {"3", "other"}
+    with db().sm.begin() as session:
+        assert session.scalars(select(model.Raid.id)).all() == [3]
+        assert session.scalar(select(func.count()).select_from(model.RaidUser)) == 1
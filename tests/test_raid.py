@@ -0,0 +1,245 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from typing import cast
+
+import arc
+import hikari
+import pytest
+from hikari import ResponseType
+from sqlalchemy import func, select
+
+from airona.db import model
+from airona.db.connection import db
+from airona.ext import raid
+from airona.lib.raid import create_raid, reminder_lead
+from airona.lib.rest import RestBudget
+from airona.lib.stats import load_backfill_range
+
+USERS = [10**17 + i for i in range(30)]
+
+
+class FakeDispatcher:
+    def __init__(self) -> None:
+        self.sent: list[int] = []
+
+    def send(self, discord_id: int, message: object) -> None:
+        self.sent.append(discord_id)
+
+
+@pytest.fixture
+def dispatcher(monkeypatch: pytest.MonkeyPatch) -> FakeDispatcher:
+    async def update_raid_message(raid_id: int) -> None: ...
+
+    dispatcher = FakeDispatcher()
+    raid.interaction_cache.cache_clear()
+    monkeypatch.setattr(raid, "update_raid_message", update_raid_message)
+    monkeypatch.setattr(raid, "dm_dispatcher", lambda: dispatcher)
+    return dispatcher
+
+
+@pytest.fixture
+def new_raid(dispatcher: FakeDispatcher) -> Callable[[int], int]:
+    with db().sm.begin() as session:
+        # raids created after the attendance backfill are tracked
+        load_backfill_range(session)
+
+    def new_raid(message_id: int) -> int:
+        with db().sm.begin() as session:
+            return create_raid(
+                session,
+                1,
+                2,
+                message_id,
+                100,
+                "host",
+                "1",
+                int(time.time()) + 3600,
+                "title",
+            ).id
+
+    return new_raid
+
+
+class FakeInteraction:
+    def __init__(self, custom_id: str, member_id: int, edited: datetime) -> None:
+        self.custom_id = custom_id
+        self.guild_id = 1
+        self.channel_id = 2
+        self.member = SimpleNamespace(id=member_id)
+        self.message = SimpleNamespace(
+            id=3, timestamp=datetime(2026, 1, 1, tzinfo=UTC), edited_timestamp=edited
+        )
+        self.responses: list[ResponseType] = []
+
+    async def create_initial_response(self, response_type: ResponseType, **_) -> None:
+        self.responses.append(response_type)
+
+
+def subcommand(name: str) -> Callable[..., Awaitable[None]]:
+    command = raid.raid_group.children[name]
+    assert isinstance(command, arc.SlashSubCommand)
+    return command.callback
+
+
+def handle(itx: FakeInteraction) -> Awaitable[None]:
+    return raid.handle_component(cast(hikari.ComponentInteraction, itx))
+
+
+def signed_up(raid_id: int) -> dict[int, tuple[str, bool]]:
+    with db().sm.begin() as session:
+        return {
+            user.discord_id: (user.role, user.has_cleared)
+            for user in session.scalars(
+                select(model.RaidUser).where(model.RaidUser.raid_id == raid_id)
+            )
+        }
+
+
+def events(raid_id: int) -> int:
+    with db().sm.begin() as session:
+        return (
+            session.scalar(
+                select(func.count()).where(model.RaidEvent.raid_id == raid_id)
+            )
+            or 0
+        )
+
+
+def test_bulk_commands_stay_within_budget(ctx, dispatcher, new_raid) -> None:
+    add_many = subcommand("add-many")
+    remove_many = subcommand("remove-many")
+    raid_id = new_raid(3)
+
+    asyncio.run(add_many(ctx, "3", " ".join(map(str, USERS[:20])), "dps", False))
+    assert signed_up(raid_id) == {user: ("dps", False) for user in USERS[:20]}
+
+    # updates the first 20 and adds the other 10 in the same command
+    mentions = " ".join(f"<@{user}>" for user in USERS)
+    asyncio.run(add_many(ctx, "3", mentions, "tank", True))
+    assert signed_up(raid_id) == {user: ("tank", True) for user in USERS}
+
+    asyncio.run(remove_many(ctx, "3", " ".join(map(str, USERS[:25])), "full"))
+    assert signed_up(raid_id) == {user: ("tank", True) for user in USERS[25:]}
+    assert dispatcher.sent == USERS[:25]
+    assert events(raid_id) == 20 + 20 * 2 + 10 + 25
+    assert not any(r.startswith("\N{CROSS MARK}") for r in ctx.responses)
+
+
+def test_move_stays_within_budget(ctx, new_raid) -> None:
+    add_many = subcommand("add-many")
+    move = subcommand("move")
+    source_id, target_id = new_raid(3), new_raid(4)
+
+    asyncio.run(add_many(ctx, "3", " ".join(map(str, USERS)), "dps", False))
+    asyncio.run(add_many(ctx, "4", " ".join(map(str, USERS[:10])), "tank", True))
+    asyncio.run(move(ctx, "3", "4"))
+
+    assert signed_up(source_id) == {}
+    assert signed_up(target_id) == {
+        user: ("tank", True) if user in USERS[:10] else ("dps", False) for user in USERS
+    }
+    assert events(source_id) == 30 + 30
+    assert events(target_id) == 10 + 20
+    assert ctx.responses[-1] == "\N{WHITE HEAVY CHECK MARK} Moved 20 users."
+
+
+def test_cleared_click_is_applied_once(new_raid) -> None:
+    raid_id = new_raid(3)
+    rendered = datetime(2026, 1, 2, tzinfo=UTC)
+    asyncio.run(handle(FakeInteraction(raid.RAID_ROLE_DPS, 5, rendered)))
+
+    rendered = datetime(2026, 1, 3, tzinfo=UTC)
+    click = FakeInteraction(raid.RAID_CLEARED, 5, rendered)
+    asyncio.run(handle(click))
+    asyncio.run(handle(click))
+    assert signed_up(raid_id) == {5: ("dps", True)}
+    assert click.responses == [
+        ResponseType.MESSAGE_UPDATE,
+        ResponseType.DEFERRED_MESSAGE_UPDATE,
+    ]
+
+    # a click on the updated message toggles it back
+    rendered = datetime(2026, 1, 4, tzinfo=UTC)
+    asyncio.run(handle(FakeInteraction(raid.RAID_CLEARED, 5, rendered)))
+    assert signed_up(raid_id) == {5: ("dps", False)}
+
+
+class FakeRest:
+    def __init__(self, block_at: int | None = None) -> None:
+        self.block_at = block_at
+        self.sent: list[object] = []
+
+    async def create_message(self, channel: int, components: object, **_) -> None:
+        if len(self.sent) == self.block_at:
+            await asyncio.Event().wait()
+        self.sent.append(components)
+
+
+@pytest.fixture
+def use_rest(monkeypatch: pytest.MonkeyPatch) -> Callable[[FakeRest], None]:
+    chunks = [([f"chunk {i}"], []) for i in range(3)]
+    monkeypatch.setattr(raid, "build_raid_ping", lambda *_: chunks)
+    monkeypatch.setattr(raid, "ping_progress", {})
+    monkeypatch.setattr(raid, "rest_budget", lambda: RestBudget(100, 1, 0, 10))
+    monkeypatch.setattr(raid.raid_cfg(), "raid_ping_retry_delay", 0)
+
+    def use_rest(rest: FakeRest) -> None:
+        client = SimpleNamespace(rest=rest)
+        monkeypatch.setattr(raid, "plugin", SimpleNamespace(client=client))
+
+    return use_rest
+
+
+def test_cancelled_ping_resumes_unsent_chunks(use_rest, new_raid) -> None:
+    raid_id = new_raid(3)
+
+    async def cancel_ping(rest: FakeRest) -> None:
+        task = asyncio.create_task(raid.raid_ping(raid_id))
+        while len(rest.sent) < 1:
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    rest = FakeRest(block_at=1)
+    use_rest(rest)
+    asyncio.run(cancel_ping(rest))
+    assert rest.sent == [["chunk 0"]]
+    assert raid.ping_progress == {raid_id: {0}}
+
+    rest = FakeRest()
+    use_rest(rest)
+    asyncio.run(raid.raid_ping(raid_id))
+    assert rest.sent == [["chunk 1"], ["chunk 2"]]
+    assert raid.ping_progress == {}
+
+
+def test_ping_retries_chunks_in_order(use_rest, new_raid) -> None:
+    raid_id = new_raid(3)
+    attempts: list[object] = []
+
+    class FlakyRest(FakeRest):
+        async def create_message(self, channel: int, components: object, **_) -> None:
+            attempts.append(components)
+            if components == ["chunk 1"] and attempts.count(components) < 3:
+                raise OSError
+            await super().create_message(channel, components)
+
+    rest = FlakyRest()
+    use_rest(rest)
+    asyncio.run(raid.raid_ping(raid_id))
+    assert attempts == [["chunk 0"], *[["chunk 1"]] * 3, ["chunk 2"]]
+    assert rest.sent == [["chunk 0"], ["chunk 1"], ["chunk 2"]]
+
+
+def test_reminder_lead_is_the_latest_due_offset(monkeypatch) -> None:
+    monkeypatch.setattr(raid.raid_cfg(), "raid_reminder_offsets", [86400, 900, 0])
+    when = 100_000
+    assert reminder_lead(when, when - 86400) == 86400
+    assert reminder_lead(when, when - 3600) == 86400
+    assert reminder_lead(when, when - 900) == 900
+    assert reminder_lead(when, when - 60) == 900
+    assert reminder_lead(when, when + 60) == 0
@@ -0,0 +1,56 @@
+import time
+from typing import cast
+
+import pytest
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import delete, insert, select
+
+from airona.db import model
+from airona.db.connection import db
+from airona.lib.raid import create_raid
+from airona.lib.reconcile import reconcile_jobs, remove_stale_jobs
+
+
+class FakeScheduler:
+    def __init__(self, jobs: set[str]) -> None:
+        self.jobs = jobs
+
+    def remove_job(self, job_id: str) -> None:
+        if job_id not in self.jobs:
+            raise JobLookupError(job_id)
+        self.jobs.remove(job_id)
+
+
+def test_legacy_jobs_are_removed_after_commit() -> None:
+    jobstore = SQLAlchemyJobStore(url="sqlite:///save/jobstore.db")
+    jobstore.jobs_t.create(jobstore.engine, checkfirst=True)
+    with jobstore.engine.begin() as conn:
+        conn.execute(
+            insert(jobstore.jobs_t),
+            [{"id": job_id, "next_run_time": 0, "job_state": b""} for job_id in "12"],
+        )
+    fake = FakeScheduler({"1", "2"})
+    scheduler = cast(AsyncIOScheduler, fake)
+    with db().sm.begin() as session:
+        raid_id = create_raid(
+            session, 1, 2, 10, 100, "host", "1", int(time.time()) + 60, "title"
+        ).id
+        # a raid from before the reminder sweep only has its legacy job
+        session.execute(delete(model.RaidReminder))
+
+    with pytest.raises(RuntimeError):
+        with db().sm.begin() as session:
+            reconcile_jobs(scheduler, jobstore, session, int(time.time()))
+            raise RuntimeError
+    assert fake.jobs == {"1", "2"}
+
+    with db().sm.begin() as session:
+        result = reconcile_jobs(scheduler, jobstore, session, int(time.time()))
+    assert (result.orphan_jobs, result.legacy_jobs) == (1, 1)
+    assert result.stale_jobs == {"1", "2"}
+    remove_stale_jobs(scheduler, result.stale_jobs)
+    assert fake.jobs == set()
+    with db().sm.begin() as session:
+        assert session.scalars(select(model.RaidReminder.raid_id)).all() == [raid_id]
@@ -0,0 +1,19 @@
+import asyncio
+
+from airona.lib.rest import Priority, RestBudget
+
+
+def test_routes_stay_within_the_cap() -> None:
+    budget = RestBudget(5, 5, 1, 2)
+
+    async def edit(channel_id: int) -> None:
+        async with budget.slot(Priority.EDIT, channel_id):
+            pass
+
+    async def edit_all() -> None:
+        for channel_id in range(5):
+            await edit(channel_id)
+
+    # every route has just been used, so none of them is idle
+    asyncio.run(edit_all())
+    assert list(budget.routes) == [3, 4]
@@ -0,0 +1,23 @@
+import pytest
+
+from airona.db.connection import db
+from airona.lib import stats
+
+
+def test_backfill_range_moves_on_commit() -> None:
+    with db().sm.begin() as session:
+        assert stats.load_backfill_range(session) == (0, 0)
+        assert stats.backfill_range is None
+    assert stats.backfill_range == (0, 0)
+
+
+def test_backfill_range_ignores_rollback() -> None:
+    with pytest.raises(RuntimeError):
+        with db().sm.begin() as session:
+            stats.load_backfill_range(session)
+            raise RuntimeError
+    assert stats.backfill_range is None
+    with db().sm.begin() as session:
+        assert session.info.get(stats.PENDING_BACKFILL_RANGE) is None
+        assert stats.load_backfill_range(session) == (0, 0)
+    assert stats.backfill_range == (0, 0)
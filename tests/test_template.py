@@ -0,0 +1,102 @@
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+from airona.db import model
+from airona.db.connection import db
+from airona.env import RAID_CFG_PATH, raid_cfg
+from airona.lib import template
+from airona.lib.template import get_guild_template, set_guild_template
+
+
+def set_template(field: str, value: str) -> None:
+    with db().sm.begin() as session:
+        set_guild_template(session, 1, field, value)
+
+
+@pytest.mark.parametrize(
+    "template",
+    [
+        "{title} {users}",
+        "{{literal}} {raid_message_link}",
+    ],
+)
+def test_plain_fields_are_accepted(template: str) -> None:
+    set_template("raid_ping_template", template)
+    with db().sm.begin() as session:
+        guild_template = get_guild_template(session, 1)
+        assert guild_template is not None
+        assert guild_template.raid_ping_template == template
+
+
+@pytest.mark.parametrize(
+    "template",
+    [
+        "{title:>2000000000}",
+        "{title!r}",
+        "{title.upper}",
+        "{users[0]}",
+        "{}",
+        "{unknown}",
+        "x" * 2001,
+    ],
+)
+def test_unsafe_templates_are_rejected(template: str) -> None:
+    with pytest.raises(ValueError):
+        set_template("raid_ping_template", template)
+    with db().sm.begin() as session:
+        assert session.get(model.GuildTemplate, 1) is None
+
+
+@pytest.mark.parametrize(
+    "emoji",
+    [
+        "\N{THUMBS UP SIGN}",
+        "\N{THUMBS UP SIGN}\N{EMOJI MODIFIER FITZPATRICK TYPE-4}",
+        "\N{HEAVY BLACK HEART}\N{VARIATION SELECTOR-16}",
+        "\N{REGIONAL INDICATOR SYMBOL LETTER D}\N{REGIONAL INDICATOR SYMBOL LETTER E}",
+        "1\N{VARIATION SELECTOR-16}\N{COMBINING ENCLOSING KEYCAP}",
+        "\N{WOMAN}\N{ZERO WIDTH JOINER}\N{PERSONAL COMPUTER}",
+        "<:dps:1449010393916903586>",
+        "<a:dps:1449010393916903586>",
+    ],
+)
+def test_emojis_are_accepted(emoji: str) -> None:
+    set_template("dps_emoji", emoji)
+
+
+@pytest.mark.parametrize(
+    "emoji",
+    ["dps", "é", "\N{THUMBS UP SIGN} x", "<:dps:1>x", "\N{CJK UNIFIED IDEOGRAPH-4E00}"],
+)
+def test_non_emojis_are_rejected(emoji: str) -> None:
+    with pytest.raises(ValueError):
+        set_template("dps_emoji", emoji)
+
+
+def test_changed_config_is_reloaded(monkeypatch) -> None:
+    monkeypatch.setattr(template, "_raid_cfg_mtime", None)
+    path = Path(RAID_CFG_PATH)
+    reload = template.reload_raid_templates_if_changed
+
+    assert not asyncio.run(reload())
+    path.write_text(path.read_text().replace("{title}: {users}", "{users}"))
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 1))
+    assert asyncio.run(reload())
+    assert raid_cfg().raid_ping_template == "{users}"
+
+
+@pytest.mark.parametrize(
+    ("seconds", "lead"),
+    [
+        (0, "now"),
+        (30, "now"),
+        (600, "in 10 minutes"),
+        (3660, "in 1 hour 1 minute"),
+        (86400, "in 1 day"),
+    ],
+)
+def test_lead_is_formatted(seconds: int, lead: str) -> None:
+    assert template.format_lead(seconds) == lead